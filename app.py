@@ -1,36 +1,192 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import (
+    Blueprint, Flask, current_app,
+    render_template, request, redirect, url_for, jsonify,
+    Response, abort, g, has_request_context, send_from_directory, session,
+    stream_with_context,
+    before_render_template, template_rendered
+)
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import (
     LoginManager, UserMixin,
     login_user, login_required, logout_user, current_user
 )
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from sqlalchemy import func
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+try:
+    import brotli
+except ImportError:  # sem Brotli: só gzip
+    brotli = None
+from sqlalchemy import (
+    and_, event, exists, func, literal, or_, text, tuple_, union, union_all, update
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from collections import Counter, OrderedDict, deque
 from datetime import datetime, date, timedelta
+import click
+import csv
+import gzip
+import hashlib
+import io
+import json
+import math
+import mimetypes
 import os
+import posixpath
+import re
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
 
 # =====================
 # CONFIGURAÇÃO
 # =====================
-app = Flask(__name__)
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
-
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DB_PATH = os.path.join(BASE_DIR, "database", "banco.db")
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
 
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-db = SQLAlchemy(app)
+def configurar(app):
+    app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
 
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
+        "DATABASE_URL", f"sqlite:///{DB_PATH}"
+    )
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "connect_args": {"check_same_thread": False},
+    }
+    # pool por processo: cada worker do gunicorn abre o seu, com folga para
+    # workers gthread. O SQLite serializa as escritas de qualquer forma.
+    # Banco em memória usa o pool próprio do SQLAlchemy, sem essas opções.
+    if make_url(app.config["SQLALCHEMY_DATABASE_URI"]).database not in (None, "", ":memory:"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+            "max_overflow": 10,
+            "pool_timeout": 30,
+        })
+    app.config["SQLITE_TUNING"] = os.environ.get("SQLITE_TUNING", "1") != "0"
+    app.config["SQLITE_BUSY_TIMEOUT"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 15000))
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    app.config["CACHE_MARCADOR"] = os.environ.get(
+        "CACHE_MARCADOR", os.path.join(BASE_DIR, "database", "cache.versao")
+    )
+    app.config["VENDAS_POR_PAGINA"] = int(os.environ.get("VENDAS_POR_PAGINA", 50))
+    app.config["PRODUTOS_POR_PAGINA"] = int(os.environ.get("PRODUTOS_POR_PAGINA", 50))
+
+    # instrumentação por requisição, desligada por padrão
+    app.config["PERFIL_ATIVO"] = os.environ.get("PERFIL", "0") == "1"
+    app.config["PERFIL_LOG"] = os.environ.get("PERFIL_LOG", "0") == "1"
+    app.config["PERFIL_AMOSTRAS"] = int(os.environ.get("PERFIL_AMOSTRAS", 1000))
+    app.config["PERFIL_LIMITE_N1"] = int(os.environ.get("PERFIL_LIMITE_N1", 5))
+    # ids (separados por vírgula) de quem abre o painel; 1 é o admin criado
+    # pelo inicializar-banco, mesmo que tenha mudado de nome
+    app.config["PERFIL_USUARIOS"] = {
+        int(i) for i in os.environ.get("PERFIL_USUARIOS", "1").split(",") if i.strip()
+    }
+
+    # fila de tarefas: sem TAREFAS_EM_FILA=1 tudo roda dentro do request
+    app.config["TAREFAS_EM_FILA"] = os.environ.get("TAREFAS_EM_FILA", "0") == "1"
+    app.config["TAREFAS_PASTA"] = os.environ.get(
+        "TAREFAS_PASTA", os.path.join(BASE_DIR, "database", "tarefas")
+    )
+    app.config["TAREFAS_INTERVALO"] = float(os.environ.get("TAREFAS_INTERVALO", 1))
+    app.config["TAREFAS_ESPERA"] = int(os.environ.get("TAREFAS_ESPERA", 30))
+    app.config["TAREFAS_TEMPO_LIMITE"] = int(os.environ.get("TAREFAS_TEMPO_LIMITE", 900))
+    app.config["TAREFAS_RETENCAO_DIAS"] = int(os.environ.get("TAREFAS_RETENCAO_DIAS", 7))
+
+    # static/ com hash no nome (flask construir-assets) e compressão de HTML
+    app.config["ASSETS_PASTA"] = os.path.join(BASE_DIR, "static", "dist")
+    app.config["COMPRIMIR_RESPOSTAS"] = os.environ.get("COMPRIMIR_RESPOSTAS", "1") != "0"
+    app.config["COMPRIMIR_MINIMO"] = int(os.environ.get("COMPRIMIR_MINIMO", 500))
+
+    # vendas de períodos fechados (flask arquivar-vendas); sem ARQUIVO_BANCO
+    # fica em <banco>_arquivo.db, ao lado do banco principal
+    app.config["ARQUIVO_BANCO"] = os.environ.get("ARQUIVO_BANCO")
+    app.config["ARQUIVO_MESES"] = int(os.environ.get("ARQUIVO_MESES", 24))
+    app.config["ARQUIVO_LOTE"] = int(os.environ.get("ARQUIVO_LOTE", 5000))
+
+    # limite de logins errados por janela deslizante, em cada worker. Os
+    # caixas atrás de um mesmo NAT chegam todos com o IP da loja e dividem o
+    # LOGIN_MAX_IP: aumente o valor nesse caso, ou use 0 para desligar o
+    # limite por IP (o limite por usuário continua).
+    app.config["LOGIN_JANELA"] = int(os.environ.get("LOGIN_JANELA", 300))
+    app.config["LOGIN_MAX_USUARIO"] = int(os.environ.get("LOGIN_MAX_USUARIO", 5))
+    app.config["LOGIN_MAX_IP"] = int(os.environ.get("LOGIN_MAX_IP", 20))
+
+    # proxies na frente do app (roteador da hospedagem, nginx); o IP do
+    # cliente vem do X-Forwarded-For que eles acrescentam. 0 = acesso direto.
+    app.config["PROXIES_CONFIAVEIS"] = int(os.environ.get("PROXIES_CONFIAVEIS", 0))
+
+
+db = SQLAlchemy()
+
+login_manager = LoginManager()
+login_manager.login_view = "loja.login"
+
+# todas as rotas e comandos; registrado no app por create_app()
+bp = Blueprint("loja", __name__, cli_group=None)
+
+
+def configurar_sqlite(dbapi_connection, config):
+    """Ajusta cada conexão SQLite nova.
+
+    WAL deixa leituras rodarem enquanto alguém escreve, e o busy_timeout
+    faz o escritor esperar a vez em vez de falhar com "database is locked".
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    if not config["SQLITE_TUNING"]:
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {config['SQLITE_BUSY_TIMEOUT']}")
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute("PRAGMA mmap_size = 268435456")  # 256 MB
+    cursor.execute("PRAGMA cache_size = -65536")    # 64 MB
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.close()
+
+
+def anexar_arquivo(dbapi_connection, config):
+    """Anexa o banco de arquivo como ``arquivo`` em cada conexão, para as
+    consultas lerem vendas ativas e arquivadas juntas (ATTACH).
+
+    O SQLite cria o arquivo na primeira vez. Com banco em memória, o
+    arquivo também fica em memória.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    caminho = config["ARQUIVO_BANCO"]
+    if not caminho:
+        principal = cursor.execute("PRAGMA database_list").fetchone()[2]
+        caminho = f"{os.path.splitext(principal)[0]}_arquivo.db" if principal else ""
+
+    cursor.execute("ATTACH DATABASE ? AS arquivo", (caminho,))
+    if config["SQLITE_TUNING"] and caminho:
+        cursor.execute("PRAGMA arquivo.journal_mode = WAL")
+        cursor.execute("PRAGMA arquivo.synchronous = NORMAL")
+    cursor.close()
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
 
+# versões reduzidas geradas no upload (maior lado, em px)
+TAMANHOS_IMAGEM = {"mini": 96, "media": 800}
+# nomes gerados pelo hash do conteúdo: <hash>.<ext> e <hash>_<tamanho>.webp
+NOME_HASH = re.compile(r"^[0-9a-f]{32}(_[a-z]+)?\.[a-z]+$")
+
 # =====================
 # MODELOS
 # =====================
@@ -38,9 +194,13 @@ class Usuario(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     usuario = db.Column(db.String(50), unique=True, nullable=False)
     senha = db.Column(db.String(200), nullable=False)
+    # muda ao trocar nome ou senha; sessões com a versão antiga caem
+    versao_sessao = db.Column(db.Integer, default=0)
 
 
 class Produto(db.Model):
+    __table_args__ = (db.Index("ix_produto_nome", "nome"),)
+
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(30), unique=True, nullable=False)
     nome = db.Column(db.String(100), nullable=False)
@@ -52,14 +212,208 @@ class Produto(db.Model):
     imagem = db.Column(db.String(200))
 
 
+class Pedido(db.Model):
+    """Cabeçalho de uma venda com vários itens; cada item é uma Venda."""
+    # ids nunca reusados (ver garantir_ids_crescentes)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.DateTime, default=datetime.utcnow)
+
+    itens = db.relationship("Venda", back_populates="pedido")
+
+
 class Venda(db.Model):
+    __table_args__ = (
+        db.Index("ix_venda_data", "data"),
+        db.Index("ix_venda_produto_data", "produto_id", "data"),
+        db.Index("ix_venda_pedido", "pedido_id"),
+        # ids nunca reusados: o livro de estoque e o arquivo guardam venda_id
+        {"sqlite_autoincrement": True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     produto_id = db.Column(db.Integer, db.ForeignKey("produto.id"), nullable=False)
     quantidade = db.Column(db.Integer, nullable=False)
     preco_unitario = db.Column(db.Float, nullable=False)
+    # custo do produto na hora da venda; o resumo diário soma e subtrai
+    # sempre este valor, mesmo que o custo do produto mude depois
+    preco_custo = db.Column(db.Float)
     data = db.Column(db.DateTime, default=datetime.utcnow)
+    # vendas de um item só (as antigas inclusive) não têm pedido
+    pedido_id = db.Column(db.Integer, db.ForeignKey("pedido.id"))
 
     produto = db.relationship("Produto")
+    pedido = db.relationship("Pedido", back_populates="itens")
+
+
+class PedidoArquivado(db.Model):
+    """Pedido de período arquivado, no banco anexado como ``arquivo``."""
+    __tablename__ = "pedido"
+    __table_args__ = {"schema": "arquivo"}
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    data = db.Column(db.DateTime)
+
+
+class VendaArquivada(db.Model):
+    """Venda de período fechado, movida de ``venda`` por ``flask
+    arquivar-vendas`` com o mesmo id. Sem FK: o SQLite não liga tabelas de
+    bancos diferentes."""
+    __tablename__ = "venda"
+    __table_args__ = (
+        db.Index("ix_arquivo_venda_data", "data"),
+        db.Index("ix_arquivo_venda_produto_data", "produto_id", "data"),
+        {"schema": "arquivo"},
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    produto_id = db.Column(db.Integer, nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)
+    preco_unitario = db.Column(db.Float, nullable=False)
+    preco_custo = db.Column(db.Float)
+    data = db.Column(db.DateTime)
+    pedido_id = db.Column(db.Integer)
+
+    produto = db.relationship(
+        "Produto", primaryjoin="foreign(VendaArquivada.produto_id) == Produto.id"
+    )
+
+
+class Arquivamento(db.Model):
+    """Uma execução de ``arquivar-vendas``. O maior ``corte`` fecha o
+    período: vendas anteriores a ele não se criam, editam nem excluem."""
+    __table_args__ = {"schema": "arquivo"}
+
+    id = db.Column(db.Integer, primary_key=True)
+    corte = db.Column(db.DateTime, nullable=False)
+    data = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    vendas = db.Column(db.Integer, nullable=False, default=0)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+
+
+class VendaDiaria(db.Model):
+    """Resumo das vendas por dia e produto, mantido junto com cada venda."""
+    __table_args__ = (db.UniqueConstraint("dia", "produto_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, nullable=False)
+    produto_id = db.Column(db.Integer, db.ForeignKey("produto.id"), nullable=False)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Float, nullable=False, default=0)
+    custo = db.Column(db.Float, nullable=False, default=0)
+
+
+class VendaDiariaLoja(db.Model):
+    """Resumo das vendas por dia da loja toda: uma linha por dia, seja qual
+    for o tamanho do catálogo. É o que o dashboard lê."""
+    __tablename__ = "venda_diaria_loja"
+
+    dia = db.Column(db.Date, primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Float, nullable=False, default=0)
+    custo = db.Column(db.Float, nullable=False, default=0)
+
+
+class MovimentoEstoque(db.Model):
+    """Livro de estoque: cada mudança em Produto.quantidade vira uma linha,
+    gravada na mesma transação. Só aceita INSERT (gatilhos no banco).
+
+    ``preco_custo`` é o custo do produto no momento do movimento, para
+    calcular o valor do estoque em datas passadas.
+    """
+    __tablename__ = "movimento_estoque"
+    __table_args__ = (
+        db.Index("ix_movimento_produto", "produto_id", "id"),
+        db.Index("ix_movimento_data", "data"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    produto_id = db.Column(db.Integer, db.ForeignKey("produto.id"), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)  # + entra, - sai
+    preco_custo = db.Column(db.Float, nullable=False)
+    # abertura, cadastro, importacao, venda, edicao, estorno, ajuste
+    motivo = db.Column(db.String(20), nullable=False)
+    # sem FK: o movimento continua no livro depois que a venda é excluída
+    # (e o id dela não volta a ser usado: venda é AUTOINCREMENT)
+    venda_id = db.Column(db.Integer)
+
+    venda = db.relationship(
+        "Venda", primaryjoin="foreign(MovimentoEstoque.venda_id) == Venda.id"
+    )
+
+
+class FotoEstoque(db.Model):
+    """Foto periódica do estoque (comando ``foto-estoque``).
+
+    Guarda a quantidade e o custo de cada produto depois do movimento
+    ``movimento_id``; a posição numa data é a foto anterior mais os
+    movimentos seguintes, sem refazer o livro inteiro.
+    """
+    __tablename__ = "foto_estoque"
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.DateTime, nullable=False, index=True)
+    movimento_id = db.Column(db.Integer, nullable=False)
+
+    itens = db.relationship("FotoEstoqueItem", cascade="all, delete-orphan")
+
+
+class FotoEstoqueItem(db.Model):
+    __tablename__ = "foto_estoque_item"
+    __table_args__ = (db.UniqueConstraint("foto_id", "produto_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    foto_id = db.Column(db.Integer, db.ForeignKey("foto_estoque.id"), nullable=False)
+    produto_id = db.Column(db.Integer, db.ForeignKey("produto.id"), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)
+    preco_custo = db.Column(db.Float, nullable=False)
+
+
+class VersaoDados(db.Model):
+    """Linha única (id=1) com um contador que os gatilhos de venda e produto
+    incrementam a cada escrita, e reconstruir_resumo também. Vira a ETag de
+    /dashboard/dados e a chave do cache da análise."""
+    __tablename__ = "versao_dados"
+
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Tarefa(db.Model):
+    """Trabalho em segundo plano (ver "TAREFAS EM SEGUNDO PLANO")."""
+    __table_args__ = (db.Index("ix_tarefa_fila", "estado", "disponivel_em"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(40), nullable=False)
+    parametros = db.Column(db.Text, nullable=False)  # JSON
+    # pendente -> executando -> concluida | falhou (ou pendente de novo)
+    estado = db.Column(db.String(12), nullable=False, default="pendente")
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    disponivel_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    iniciada_em = db.Column(db.DateTime)
+    concluida_em = db.Column(db.DateTime)
+    erro = db.Column(db.Text)
+    trabalhador = db.Column(db.String(80))
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuario.id"))
+
+    resultado = db.relationship(
+        "ResultadoTarefa", uselist=False, cascade="all, delete-orphan"
+    )
+
+
+class ResultadoTarefa(db.Model):
+    """Saída de uma tarefa concluída: um resumo JSON e/ou um arquivo."""
+    __tablename__ = "resultado_tarefa"
+
+    tarefa_id = db.Column(db.Integer, db.ForeignKey("tarefa.id"), primary_key=True)
+    dados = db.Column(db.Text)  # JSON
+    caminho = db.Column(db.String(100))  # nome do arquivo em TAREFAS_PASTA
+    nome_arquivo = db.Column(db.String(100))
+    mimetype = db.Column(db.String(60))
 
 
 class Configuracao(db.Model):
@@ -70,9 +424,94 @@ class Configuracao(db.Model):
     cor_perigo = db.Column(db.String(7), default="#dc2626")
 
 
+# =====================
+# CACHE EM MEMÓRIA
+# =====================
+# Cada worker guarda sua cópia. O arquivo CACHE_MARCADOR tem um token que
+# muda a cada invalidação; quando o token lido difere do guardado, o worker
+# descarta o cache. Assim um save em um worker vale para todos.
+_cache = {}
+_cache_versao = None
+_FALTA = object()  # None é um valor válido no cache
+
+
+def versao_cache():
+    try:
+        with open(current_app.config["CACHE_MARCADOR"]) as arquivo:
+            return arquivo.read()
+    except FileNotFoundError:
+        return ""
+
+
+def cache_obter(chave, carregar):
+    """Devolve ``_cache[chave]``, chamando ``carregar()`` se não houver.
+
+    Objetos do banco são desligados da sessão (expunge) para continuarem
+    legíveis nos próximos requests; outros valores são guardados como vêm.
+    """
+    global _cache_versao
+
+    versao = versao_cache()
+    if versao != _cache_versao:
+        _cache.clear()
+        _cache_versao = versao
+
+    # lido uma vez só: outra thread pode limpar o cache entre duas leituras
+    valor = _cache.get(chave, _FALTA)
+    if valor is _FALTA:
+        valor = carregar()
+        if isinstance(valor, db.Model):
+            db.session.expunge(valor)
+        _cache[chave] = valor
+
+    return valor
+
+
+def invalidar_cache():
+    """Limpa o cache deste worker e avisa os outros trocando o token."""
+    global _cache_versao
+
+    _cache.clear()
+    _cache_versao = uuid.uuid4().hex
+
+    temporario = current_app.config["CACHE_MARCADOR"] + ".tmp"
+    with open(temporario, "w") as arquivo:
+        arquivo.write(_cache_versao)
+    os.replace(temporario, current_app.config["CACHE_MARCADOR"])
+
+
+class UsuarioSessao(UserMixin):
+    """Usuário logado montado com o que está na sessão assinada, sem ler
+    a tabela usuario."""
+
+    def __init__(self, id, usuario):
+        self.id = id
+        self.usuario = usuario
+
+
+def dados_sessao(usuario):
+    """O que o login guarda na sessão além do id (ver load_user)."""
+    return {
+        "usuario_nome": usuario.usuario,
+        "versao_sessao": usuario.versao_sessao or 0,
+    }
+
+
+def versoes_sessao():
+    """{id: versao_sessao} de todos os usuários, no cache do worker."""
+    return cache_obter("versoes_sessao", lambda: dict(
+        db.session.query(Usuario.id, func.coalesce(Usuario.versao_sessao, 0)).all()
+    ))
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Usuario.query.get(int(user_id))
+    """Confere a versão da sessão contra o cache; usuário excluído ou com
+    nome/senha trocados depois do login volta para a tela de login."""
+    versao = versoes_sessao().get(int(user_id))
+    if versao is None or versao != session.get("versao_sessao"):
+        return None
+    return UsuarioSessao(int(user_id), session.get("usuario_nome"))
 
 
 # =====================
@@ -81,151 +520,1046 @@ def load_user(user_id):
 def arquivo_permitido(nome):
     return "." in nome and nome.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
+def gravar_arquivo(caminho, conteudo):
+    """Grava em arquivo temporário e renomeia, para ninguém ler pela metade."""
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def nome_variante(nome, tamanho):
+    return f"{nome.rsplit('.', 1)[0]}_{tamanho}.webp"
+
+
+def salvar_imagem(conteudo, extensao):
+    """Guarda a imagem pelo hash do conteúdo e gera as versões reduzidas.
+
+    Imagens iguais viram o mesmo arquivo, e nomes repetidos não se
+    sobrescrevem. Levanta UnidentifiedImageError se não for imagem.
+    Retorna o nome do arquivo original.
+    """
+    pasta = current_app.config["UPLOAD_FOLDER"]
+    nome = f"{hashlib.sha256(conteudo).hexdigest()[:32]}.{extensao.lower()}"
+
+    with Image.open(io.BytesIO(conteudo)) as original:
+        original.load()
+        original = ImageOps.exif_transpose(original)
+
+        for tamanho, lado in TAMANHOS_IMAGEM.items():
+            destino = os.path.join(pasta, nome_variante(nome, tamanho))
+            if os.path.exists(destino):
+                continue
+
+            imagem = original.copy()
+            imagem.thumbnail((lado, lado))
+            if imagem.mode not in ("RGB", "RGBA"):
+                imagem = imagem.convert("RGBA")
+
+            saida = io.BytesIO()
+            imagem.save(saida, "WEBP", quality=80, method=6)
+            gravar_arquivo(destino, saida.getvalue())
+
+    caminho = os.path.join(pasta, nome)
+    if not os.path.exists(caminho):
+        gravar_arquivo(caminho, conteudo)
+
+    return nome
+
+
+@bp.app_template_global()
+def url_imagem(nome, tamanho=None):
+    """URL da imagem do produto; com ``tamanho``, da versão reduzida.
+
+    Imagens antigas (antes de ``flask processar-imagens``) não têm versões
+    reduzidas e caem no arquivo original.
+    """
+    if tamanho and NOME_HASH.match(nome):
+        nome = nome_variante(nome, tamanho)
+    return url_for("static", filename="uploads/" + nome)
+
+
+@bp.after_app_request
+def cache_imagens(resposta):
+    """Arquivos com hash no nome nunca mudam: cache de um ano."""
+    if request.endpoint == "static" and resposta.status_code == 200:
+        nome = os.path.basename(request.view_args.get("filename", ""))
+        if NOME_HASH.match(nome):
+            resposta.cache_control.no_cache = None
+            resposta.cache_control.public = True
+            resposta.cache_control.max_age = 31536000
+            resposta.cache_control.immutable = True
+    return resposta
+
+
+def periodo_selecionado(padrao="30"):
+    """Lê filtro/data_inicio/data_fim da query string.
+
+    Retorna (inicio, fim, filtro) com ``fim`` exclusivo (meia-noite do dia
+    seguinte), para filtrar com ``data >= inicio AND data < fim`` e usar o
+    índice. Sem filtro válido e com ``padrao=None`` retorna
+    (None, None, None), ou seja, sem filtro de data.
+    """
+    filtro = request.args.get("filtro")
+    data_inicio = request.args.get("data_inicio")
+    data_fim = request.args.get("data_fim")
+
+    hoje = date.today()
+
+    if filtro not in ("hoje", "7", "30"):
+        filtro = padrao
+
+    # 🔹 DATA MANUAL TEM PRIORIDADE
+    if data_inicio and data_fim:
+        inicio = datetime.strptime(data_inicio, "%Y-%m-%d")
+        fim = datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1)
+        filtro = None  # 🔥 IMPORTANTE: desmarca botões
+
+    elif filtro == "hoje":
+        inicio = datetime.combine(hoje, datetime.min.time())
+
+    elif filtro == "7":
+        inicio = datetime.combine(hoje - timedelta(days=6), datetime.min.time())
+
+    elif filtro == "30":
+        inicio = datetime.combine(hoje - timedelta(days=29), datetime.min.time())
+
+    else:
+        return None, None, None
+
+    if filtro:
+        fim = datetime.combine(hoje + timedelta(days=1), datetime.min.time())
+
+    return inicio, fim, filtro
+
+
+def baixar_estoque(produto_id, quantidade, motivo="venda", venda=None):
+    """Baixa o estoque direto no banco, só se houver saldo suficiente.
+
+    É um único ``UPDATE ... WHERE quantidade >= :n``, então duas vendas
+    simultâneas da última unidade não conseguem passar as duas. Quantidade
+    negativa devolve ao estoque. Retorna False se não havia saldo.
+    O movimento vai para o livro na mesma sessão.
+    """
+    if quantidade == 0:
+        return True
+
+    custo = db.session.execute(
+        update(Produto)
+        .where(Produto.id == produto_id, Produto.quantidade >= quantidade)
+        .values(quantidade=Produto.quantidade - quantidade)
+        .returning(Produto.preco_custo)
+    ).scalar()
+    if custo is None:
+        return False
+
+    registrar_movimento(produto_id, -quantidade, custo, motivo, venda)
+    return True
+
+
+def repor_estoque(produto_id, quantidade, motivo="estorno", venda=None):
+    """Devolve unidades ao estoque com um UPDATE atômico."""
+    custo = db.session.execute(
+        update(Produto)
+        .where(Produto.id == produto_id)
+        .values(quantidade=Produto.quantidade + quantidade)
+        .returning(Produto.preco_custo)
+    ).scalar()
+    registrar_movimento(produto_id, quantidade, custo, motivo, venda)
+
+
+def registrar_movimento(produto_id, quantidade, preco_custo, motivo, venda=None):
+    """Acrescenta uma linha ao livro de estoque, sem commit."""
+    db.session.add(MovimentoEstoque(
+        produto_id=produto_id,
+        quantidade=quantidade,
+        preco_custo=preco_custo,
+        motivo=motivo,
+        venda=venda
+    ))
+
+
+def abrir_livro_estoque():
+    """Saldo de abertura para produtos ainda sem nenhum movimento (bancos
+    anteriores ao livro, cargas em massa). Idempotente."""
+    sem_movimento = ~exists().where(MovimentoEstoque.produto_id == Produto.id)
+    resultado = db.session.execute(
+        MovimentoEstoque.__table__.insert().from_select(
+            ["data", "produto_id", "quantidade", "preco_custo", "motivo"],
+            db.select(
+                literal(datetime.now()), Produto.id, Produto.quantidade,
+                Produto.preco_custo, literal("abertura")
+            ).where(sem_movimento)
+        )
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def tirar_foto_estoque():
+    """Grava uma foto do estoque atual. Não faz nada (retorna None) se
+    não houve movimento desde a última foto."""
+    ultima = db.session.query(func.max(FotoEstoque.movimento_id)).scalar()
+    ultimo_movimento = db.session.query(func.max(MovimentoEstoque.id)).scalar()
+    if ultimo_movimento is None or ultimo_movimento == ultima:
+        return None
+
+    # o INSERT do cabeçalho já pega o lock de escrita; ninguém muda o
+    # estoque até o commit, então a foto e o movimento_id batem
+    foto_id = db.session.execute(
+        FotoEstoque.__table__.insert().values(
+            data=datetime.now(),
+            movimento_id=db.select(func.max(MovimentoEstoque.id)).scalar_subquery()
+        )
+    ).inserted_primary_key[0]
+    db.session.execute(
+        FotoEstoqueItem.__table__.insert().from_select(
+            ["foto_id", "produto_id", "quantidade", "preco_custo"],
+            db.select(
+                literal(foto_id), Produto.id, Produto.quantidade, Produto.preco_custo
+            )
+        )
+    )
+    db.session.commit()
+    return db.session.get(FotoEstoque, foto_id)
+
+
+def estoque_em(momento=None):
+    """Posição do estoque logo antes de ``momento`` (padrão: agora), como
+    {produto_id: (quantidade, preco_custo)}. ``momento`` é exclusivo, como
+    o ``fim`` de periodo_selecionado.
+
+    Parte da última foto antes de ``momento`` e soma só os movimentos
+    posteriores a ela. Sem foto, soma o livro inteiro. Retorna None se o
+    livro só começa depois de ``momento``: não há como saber o estoque.
+    """
+    momento = momento or datetime.now()
+    foto = FotoEstoque.query.filter(
+        FotoEstoque.data < momento
+    ).order_by(FotoEstoque.data.desc(), FotoEstoque.id.desc()).first()
+
+    if foto is None:
+        primeiro = db.session.query(func.min(MovimentoEstoque.data)).scalar()
+        if primeiro is None or primeiro >= momento:
+            return None
+
+    posicao = {}
+    desde = 0
+    if foto:
+        desde = foto.movimento_id
+        posicao = {
+            produto_id: (quantidade, custo)
+            for produto_id, quantidade, custo in db.session.query(
+                FotoEstoqueItem.produto_id,
+                FotoEstoqueItem.quantidade,
+                FotoEstoqueItem.preco_custo
+            ).filter(FotoEstoqueItem.foto_id == foto.id)
+        }
+
+    # com max(id), o SQLite devolve preco_custo da mesma linha: o custo
+    # do último movimento de cada produto
+    delta = db.session.query(
+        MovimentoEstoque.produto_id,
+        func.sum(MovimentoEstoque.quantidade),
+        MovimentoEstoque.preco_custo,
+        func.max(MovimentoEstoque.id)
+    ).filter(
+        MovimentoEstoque.id > desde,
+        MovimentoEstoque.data < momento
+    ).group_by(MovimentoEstoque.produto_id)
+
+    for produto_id, quantidade, custo, _ in delta:
+        anterior = posicao.get(produto_id, (0, custo))[0]
+        posicao[produto_id] = (anterior + quantidade, custo)
+
+    return posicao
+
+
+def valor_estoque_em(momento=None):
+    """(unidades, valor a custo) do estoque logo antes de ``momento``, ou
+    None antes do início do livro."""
+    posicao = estoque_em(momento)
+    if posicao is None:
+        return None
+
+    posicao = posicao.values()
+    return (
+        sum(quantidade for quantidade, _ in posicao),
+        sum(quantidade * custo for quantidade, custo in posicao)
+    )
+
+
+def validar_produto(preco_custo, preco_venda, quantidade):
+    """Regras do cadastro de produto. Retorna a mensagem de erro ou None."""
+    if quantidade < 0:
+        return "Quantidade inválida"
+    if preco_venda <= preco_custo:
+        return "Preço de venda deve ser maior que o custo"
+    return None
+
+
+def registrar_venda(produto, quantidade, preco, data_venda):
+    """Valida a venda, baixa o estoque e grava a venda e o resumo diário na
+    sessão atual, sem commit. Retorna (venda, None) ou (None, erro)."""
+    if quantidade <= 0:
+        return None, "Quantidade inválida"
+    if preco <= produto.preco_custo:
+        return None, "Preço abaixo do custo"
+    if periodo_arquivado(data_venda):
+        return None, "Data em período arquivado"
+    venda = Venda(
+        produto_id=produto.id,
+        quantidade=quantidade,
+        preco_unitario=preco,
+        preco_custo=produto.preco_custo,
+        data=data_venda
+    )
+    if not baixar_estoque(produto.id, quantidade, "venda", venda):
+        return None, "Quantidade inválida"
+
+    db.session.add(venda)
+    atualizar_resumo(venda)
+    return venda, None
+
+
+def atualizar_resumo(venda, sinal=1):
+    """Soma (sinal=1) ou subtrai (sinal=-1) a venda dos resumos diários
+    (por produto e da loja), pelo custo gravado na venda.
+
+    Roda na mesma sessão da venda, então entra no mesmo commit.
+    """
+    unidades = sinal * venda.quantidade
+    valores = {
+        "dia": venda.data.date(),
+        "unidades": unidades,
+        "receita": unidades * venda.preco_unitario,
+        "custo": unidades * venda.preco_custo,
+    }
+
+    for modelo, chave in (
+        (VendaDiaria, {"produto_id": venda.produto_id}),
+        (VendaDiariaLoja, {}),
+    ):
+        stmt = sqlite_insert(modelo).values(**valores, **chave)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["dia", *chave],
+            set_={
+                "unidades": modelo.unidades + stmt.excluded.unidades,
+                "receita": modelo.receita + stmt.excluded.receita,
+                "custo": modelo.custo + stmt.excluded.custo,
+            }
+        )
+        db.session.execute(stmt)
+
+
+def reconstruir_resumo():
+    """Recalcula VendaDiaria a partir das vendas ativas e arquivadas, e
+    VendaDiariaLoja a partir dela."""
+    vendas = todas_as_vendas()
+    dia = func.date(vendas.c.data)
+
+    db.session.query(VendaDiaria).delete()
+    db.session.query(VendaDiariaLoja).delete()
+    db.session.execute(
+        VendaDiaria.__table__.insert().from_select(
+            ["dia", "produto_id", "unidades", "receita", "custo"],
+            db.select(
+                dia,
+                vendas.c.produto_id,
+                func.sum(vendas.c.quantidade),
+                func.sum(vendas.c.quantidade * vendas.c.preco_unitario),
+                func.sum(vendas.c.quantidade * vendas.c.preco_custo)
+            ).group_by(dia, vendas.c.produto_id)
+        )
+    )
+    db.session.execute(
+        VendaDiariaLoja.__table__.insert().from_select(
+            ["dia", "unidades", "receita", "custo"],
+            db.select(
+                VendaDiaria.dia,
+                func.sum(VendaDiaria.unidades),
+                func.sum(VendaDiaria.receita),
+                func.sum(VendaDiaria.custo)
+            ).group_by(VendaDiaria.dia)
+        )
+    )
+    # os números mudam sem escrita em venda: a ETag do dashboard e o cache
+    # da análise precisam de uma versão nova
+    db.session.execute(
+        update(VersaoDados).where(VersaoDados.id == 1)
+        .values(versao=VersaoDados.versao + 1)
+    )
+    db.session.commit()
+
+
+def migrar_banco():
+    """Cria em bancos já existentes as colunas e os índices declarados nos
+    modelos.
+
+    ``create_all`` só cria tabelas novas, com seus índices. Colunas novas
+    em tabelas existentes precisam ser anuláveis.
+    """
+    inspetor = db.inspect(db.engine)
+
+    for tabela in db.metadata.sorted_tables:
+        existentes = {
+            c["name"] for c in inspetor.get_columns(tabela.name, schema=tabela.schema)
+        }
+        for coluna in tabela.columns:
+            if coluna.name not in existentes:
+                tipo = coluna.type.compile(db.engine.dialect)
+                db.session.execute(text(
+                    f"ALTER TABLE {tabela.fullname} ADD COLUMN {coluna.name} {tipo}"
+                ))
+        db.session.commit()
+
+        for indice in tabela.indexes:
+            indice.create(db.engine, checkfirst=True)
+
+    garantir_ids_crescentes()
+    preencher_custo_vendas()
+    criar_busca_produtos()
+    criar_versao_dados()
+    criar_livro_estoque()
+
+
+def garantir_ids_crescentes():
+    """Recria venda e pedido com AUTOINCREMENT em bancos antigos.
+
+    Sem ele o SQLite dá a uma venda nova o id da última venda excluída, e
+    movimentos do livro de estoque passam a apontar para a venda errada.
+    A sequência recomeça acima de todo id já usado na tabela, no arquivo e
+    no livro. Os gatilhos de versao_dados voltam em criar_versao_dados().
+    """
+    usados = {
+        Venda: [Venda.id, VendaArquivada.id, MovimentoEstoque.venda_id],
+        Pedido: [
+            Pedido.id, PedidoArquivado.id, Venda.pedido_id, VendaArquivada.pedido_id
+        ],
+    }
+
+    for modelo, colunas in usados.items():
+        tabela = modelo.__table__
+        criacao = db.session.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nome"
+        ), {"nome": tabela.name}).scalar()
+        if "AUTOINCREMENT" in criacao.upper():
+            continue
+
+        nova = f"{tabela.name}_nova"
+        ddl = str(CreateTable(tabela).compile(db.engine)).strip()
+        ddl = ddl.replace(f"CREATE TABLE {tabela.name} ", f"CREATE TABLE {nova} ", 1)
+        nomes = ", ".join(coluna.name for coluna in tabela.columns)
+
+        db.session.execute(text(f"DROP TABLE IF EXISTS {nova}"))
+        db.session.execute(text(ddl))
+        db.session.execute(text(
+            f"INSERT INTO {nova} ({nomes}) SELECT {nomes} FROM {tabela.name}"
+        ))
+        db.session.execute(text(f"DROP TABLE {tabela.name}"))
+        db.session.execute(text(f"ALTER TABLE {nova} RENAME TO {tabela.name}"))
+        for indice in tabela.indexes:
+            indice.create(db.session.connection())
+
+        maior = max(
+            db.session.query(func.max(coluna)).scalar() or 0 for coluna in colunas
+        )
+        db.session.execute(text(
+            "DELETE FROM sqlite_sequence WHERE name = :nome"
+        ), {"nome": tabela.name})
+        db.session.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (:nome, :seq)"
+        ), {"nome": tabela.name, "seq": maior})
+        db.session.commit()
+
+
+def preencher_custo_vendas():
+    """Vendas anteriores à coluna Venda.preco_custo recebem o custo atual do
+    produto, o mesmo que o resumo diário usava ao ser reconstruído."""
+    for modelo in (Venda, VendaArquivada):
+        db.session.execute(
+            update(modelo)
+            .where(modelo.preco_custo.is_(None))
+            .values(preco_custo=db.select(Produto.preco_custo).where(
+                Produto.id == modelo.produto_id
+            ).scalar_subquery())
+        )
+    db.session.commit()
+
+
+def criar_livro_estoque():
+    """Gatilhos que deixam movimento_estoque só de inclusão."""
+    for operacao in ("UPDATE", "DELETE"):
+        db.session.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS movimento_estoque_sem_{operacao.lower()}
+            BEFORE {operacao} ON movimento_estoque BEGIN
+                SELECT RAISE(ABORT, 'movimento_estoque aceita só INSERT');
+            END
+        """))
+    db.session.commit()
+
+
+def criar_versao_dados():
+    """Cria a linha de VersaoDados e os gatilhos que a incrementam.
+
+    Ficam no banco para pegar qualquer escrita (rotas, importação, CLI),
+    sem depender de cada rota lembrar de avisar.
+    """
+    db.session.execute(text(
+        "INSERT OR IGNORE INTO versao_dados (id, versao) VALUES (1, 0)"
+    ))
+    for tabela in ("venda", "produto"):
+        for operacao in ("INSERT", "UPDATE", "DELETE"):
+            db.session.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS versao_{tabela}_{operacao.lower()}
+                AFTER {operacao} ON {tabela} BEGIN
+                    UPDATE versao_dados SET versao = versao + 1 WHERE id = 1;
+                END
+            """))
+    db.session.commit()
+
+
+def criar_busca_produtos():
+    """Cria o índice FTS5 (trigram) dos nomes de produto, se o SQLite tiver.
+
+    O trigram acha qualquer trecho de 3+ letras do nome sem varrer a tabela.
+    Gatilhos mantêm o índice igual à tabela produto.
+    """
+    global _tem_busca_texto
+    _tem_busca_texto = None
+
+    existe = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'produto_busca'"
+    )).first()
+    if existe:
+        return
+
+    try:
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE produto_busca USING fts5("
+            "nome, content='produto', content_rowid='id', tokenize='trigram')"
+        ))
+    except OperationalError:
+        db.session.rollback()
+        return  # SQLite sem FTS5/trigram: a busca usa LIKE
+
+    db.session.execute(text("""
+        CREATE TRIGGER produto_busca_ai AFTER INSERT ON produto BEGIN
+            INSERT INTO produto_busca(rowid, nome) VALUES (new.id, new.nome);
+        END
+    """))
+    db.session.execute(text("""
+        CREATE TRIGGER produto_busca_ad AFTER DELETE ON produto BEGIN
+            INSERT INTO produto_busca(produto_busca, rowid, nome)
+            VALUES ('delete', old.id, old.nome);
+        END
+    """))
+    db.session.execute(text("""
+        CREATE TRIGGER produto_busca_au AFTER UPDATE OF nome ON produto BEGIN
+            INSERT INTO produto_busca(produto_busca, rowid, nome)
+            VALUES ('delete', old.id, old.nome);
+            INSERT INTO produto_busca(rowid, nome) VALUES (new.id, new.nome);
+        END
+    """))
+    db.session.execute(text(
+        "INSERT INTO produto_busca(produto_busca) VALUES ('rebuild')"
+    ))
+    db.session.commit()
+
+
+def buscar_produtos(termo):
+    """Consulta de produtos cujo código começa com ``termo`` ou cujo nome
+    contém ``termo``, ordenada por nome."""
+    consulta = Produto.query
+    termo = (termo or "").strip()
+
+    if termo:
+        # prefixo como faixa, para usar o índice único de codigo
+        por_codigo = db.select(Produto.id).where(
+            Produto.codigo >= termo, Produto.codigo < termo + "\uffff"
+        )
+
+        if len(termo) >= 3 and tem_busca_texto():
+            frase = '"' + termo.replace('"', '""') + '"'
+            por_nome = db.select(text("rowid")).select_from(
+                text("produto_busca")
+            ).where(
+                text("produto_busca MATCH :frase").bindparams(frase=frase)
+            )
+            consulta = consulta.filter(Produto.id.in_(union(por_codigo, por_nome)))
+        else:
+            consulta = consulta.filter(or_(
+                Produto.id.in_(por_codigo),
+                Produto.nome.contains(termo, autoescape=True)
+            ))
+
+    return consulta.order_by(Produto.nome, Produto.id)
+
+
+_tem_busca_texto = None
+
+
+def tem_busca_texto():
+    """Se o índice FTS5 de produtos existe (verificado uma vez por processo)."""
+    global _tem_busca_texto
+
+    if _tem_busca_texto is None:
+        _tem_busca_texto = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'produto_busca'"
+        )).first() is not None
+
+    return _tem_busca_texto
+
+
+def ler_cursor(cursor):
+    """Converte o cursor "data_id" da paginação em (datetime, id)."""
+    data, venda_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(data), int(venda_id)
+
 # =====================
 # LOGIN
 # =====================
-@app.route("/", methods=["GET", "POST"])
+# Horários das últimas falhas por ("usuario", nome) e ("ip", endereço). Com
+# LOGIN_MAX_* falhas dentro de LOGIN_JANELA segundos, o login é recusado
+# antes de consultar o banco ou calcular o hash da senha.
+_falhas_login = OrderedDict()
+_falhas_login_trava = threading.Lock()
+FALHAS_GUARDADAS = 10000
+
+
+def limites_login(usuario):
+    """Limites que valem para esta tentativa; o do usuário vem primeiro.
+    ``remote_addr`` é o IP do cliente já corrigido pelo ProxyFix."""
+    limites = [
+        (("usuario", usuario.strip().lower()), current_app.config["LOGIN_MAX_USUARIO"]),
+    ]
+    if current_app.config["LOGIN_MAX_IP"]:
+        limites.append((("ip", request.remote_addr), current_app.config["LOGIN_MAX_IP"]))
+    return limites
+
+
+def espera_login(limites):
+    """Segundos até a próxima tentativa valer, ou 0 se liberado."""
+    janela = current_app.config["LOGIN_JANELA"]
+    agora = time.monotonic()
+    espera = 0
+
+    with _falhas_login_trava:
+        for chave, maximo in limites:
+            falhas = _falhas_login.get(chave)
+            if falhas and len(falhas) >= maximo:
+                # a mais antiga das últimas ``maximo`` falhas sai da janela
+                espera = max(espera, falhas[0] + janela - agora)
+
+    return max(0, espera)
+
+
+def registrar_falha_login(limites):
+    agora = time.monotonic()
+
+    with _falhas_login_trava:
+        for chave, maximo in limites:
+            falhas = _falhas_login.get(chave)
+            if falhas is None or falhas.maxlen != maximo:
+                falhas = _falhas_login[chave] = deque(falhas or (), maxlen=maximo)
+            falhas.append(agora)
+            _falhas_login.move_to_end(chave)
+
+        # descarta as chaves paradas há mais tempo
+        while len(_falhas_login) > FALHAS_GUARDADAS:
+            _falhas_login.popitem(last=False)
+
+
+@bp.route("/", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
+        limites = limites_login(request.form["usuario"])
+        espera = espera_login(limites)
+        if espera:
+            return render_template(
+                "login.html",
+                erro=f"Muitas tentativas. Tente de novo em {int(espera // 60) + 1} min."
+            ), 429
+
         user = Usuario.query.filter_by(
             usuario=request.form["usuario"]
         ).first()
 
         if user and check_password_hash(user.senha, request.form["senha"]):
+            with _falhas_login_trava:
+                _falhas_login.pop(limites[0][0], None)
             login_user(user)
-            return redirect(url_for("dashboard"))
+            session.update(dados_sessao(user))
+            return redirect(url_for("loja.dashboard"))
 
+        registrar_falha_login(limites)
         return render_template("login.html", erro="Usuário ou senha inválidos")
 
     return render_template("login.html")
 
 
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for("login"))
+    return redirect(url_for("loja.login"))
 
 # =====================
 # DASHBOARD
 # =====================
-@app.route("/dashboard")
+@bp.route("/dashboard")
 @login_required
 def dashboard():
-    filtro = request.args.get("filtro")
-    data_inicio = request.args.get("data_inicio")
-    data_fim = request.args.get("data_fim")
+    # os números e o gráfico vêm de /dashboard/dados, buscados pela página
+    _, _, filtro = periodo_selecionado()
+    return render_template("dashboard.html", filtro=filtro)
 
-    hoje = date.today()
 
-    # 🔹 DATA MANUAL TEM PRIORIDADE
-    if data_inicio and data_fim:
-        inicio = datetime.strptime(data_inicio, "%Y-%m-%d")
-        fim = datetime.strptime(data_fim, "%Y-%m-%d")
-        fim = datetime.combine(fim.date(), datetime.max.time())
-        filtro = None  # 🔥 IMPORTANTE: desmarca botões
+# séries longas são agrupadas para não mandar milhares de pontos
+AGRUPAMENTOS = {
+    "dia": lambda coluna: func.date(coluna),
+    "semana": lambda coluna: func.date(coluna, "weekday 0", "-6 days"),  # segunda
+    "mes": lambda coluna: func.strftime("%Y-%m-01", coluna),
+}
 
-    elif filtro == "hoje":
-        inicio = datetime.combine(hoje, datetime.min.time())
-        fim = datetime.combine(hoje, datetime.max.time())
 
-    elif filtro == "7":
-        inicio = datetime.combine(hoje - timedelta(days=6), datetime.min.time())
-        fim = datetime.combine(hoje, datetime.max.time())
+def agrupamento_periodo(inicio, fim):
+    dias = (fim - inicio).days
+    if dias <= 92:
+        return "dia"
+    if dias <= 731:
+        return "semana"
+    return "mes"
 
-    else:
-        filtro = "30"
-        inicio = datetime.combine(hoje - timedelta(days=29), datetime.min.time())
-        fim = datetime.combine(hoje, datetime.max.time())
+
+def inicio_grupo(dia, agrupamento):
+    if agrupamento == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if agrupamento == "mes":
+        return dia.replace(day=1)
+    return dia
+
+
+def proximo_grupo(dia, agrupamento):
+    if agrupamento == "semana":
+        return dia + timedelta(days=7)
+    if agrupamento == "mes":
+        return (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return dia + timedelta(days=1)
 
 
+def dados_dashboard(inicio, fim, agrupamento):
+    hoje = date.today()
+
     # =====================
     # ESTOQUE
     # =====================
-    total_produtos = Produto.query.count()
-
-    total_estoque = db.session.query(
-        func.coalesce(func.sum(Produto.quantidade), 0)
-    ).scalar()
-
-    valor_estoque = db.session.query(
+    total_produtos, total_estoque, valor_estoque = db.session.query(
+        func.count(Produto.id),
+        func.coalesce(func.sum(Produto.quantidade), 0),
         func.coalesce(func.sum(Produto.preco_custo * Produto.quantidade), 0)
-    ).scalar()
+    ).one()
 
     # =====================
-    # VENDAS / LUCRO
+    # VENDAS / LUCRO (lidos do resumo diário da loja, uma linha por dia)
     # =====================
-    total_vendas = db.session.query(
-        func.coalesce(func.sum(Venda.quantidade * Venda.preco_unitario), 0)
+    total_vendas, lucro_total = db.session.query(
+        func.coalesce(func.sum(VendaDiariaLoja.receita), 0),
+        func.coalesce(func.sum(VendaDiariaLoja.receita - VendaDiariaLoja.custo), 0)
     ).filter(
-        Venda.data.between(inicio, fim)
-    ).scalar()
+        VendaDiariaLoja.dia >= inicio.date(),
+        VendaDiariaLoja.dia < fim.date()
+    ).one()
 
     vendas_dia = db.session.query(
-        func.coalesce(func.sum(Venda.quantidade * Venda.preco_unitario), 0)
+        func.coalesce(func.sum(VendaDiariaLoja.receita), 0)
     ).filter(
-        func.date(Venda.data) == hoje
-    ).scalar()
-
-    lucro_total = db.session.query(
-        func.coalesce(
-            func.sum((Venda.preco_unitario - Produto.preco_custo) * Venda.quantidade),
-            0
-        )
-    ).join(Produto).filter(
-        Venda.data.between(inicio, fim)
+        VendaDiariaLoja.dia == hoje
     ).scalar()
 
     # =====================
     # GRÁFICO
     # =====================
-    vendas_db = db.session.query(
-        func.strftime("%Y-%m-%d", Venda.data),
-        func.sum(Venda.quantidade * Venda.preco_unitario)
+    grupo = AGRUPAMENTOS[agrupamento](VendaDiariaLoja.dia)
+    mapa = dict(db.session.query(
+        grupo,
+        func.sum(VendaDiariaLoja.receita)
     ).filter(
-        Venda.data.between(inicio, fim)
-    ).group_by(
-        func.strftime("%Y-%m-%d", Venda.data)
-    ).all()
+        VendaDiariaLoja.dia >= inicio.date(),
+        VendaDiariaLoja.dia < fim.date()
+    ).group_by(grupo).all())
+
+    rotulos, valores = [], []
+    d = inicio_grupo(inicio.date(), agrupamento)
+    while d < fim.date():
+        chave = d.strftime("%Y-%m-%d")
+        rotulos.append(chave)
+        valores.append(round(float(mapa.get(chave, 0)), 2))
+        d = proximo_grupo(d, agrupamento)
+
+    # período já encerrado: valor do estoque no fim dele, pelo livro
+    # (None antes do livro existir: o estoque daquela época não é conhecido)
+    valor_estoque_fim = None
+    if fim.date() <= hoje:
+        posicao = valor_estoque_em(fim)
+        if posicao:
+            valor_estoque_fim = round(posicao[1], 2)
+
+    return {
+        "total_produtos": total_produtos,
+        "total_estoque": total_estoque,
+        "valor_estoque": round(float(valor_estoque), 2),
+        "valor_estoque_fim": valor_estoque_fim,
+        "vendas_dia": round(float(vendas_dia), 2),
+        "total_vendas": round(float(total_vendas), 2),
+        "lucro_total": round(float(lucro_total), 2),
+        "agrupamento": agrupamento,
+        "rotulos": rotulos,
+        "valores": valores,
+    }
+
+
+def versao_dados():
+    """Contador de VersaoDados: muda a cada escrita em venda ou produto e a
+    cada reconstrução do resumo."""
+    return db.session.execute(text(
+        "SELECT versao FROM versao_dados WHERE id = 1"
+    )).scalar()
+
+
+@bp.route("/dashboard/dados")
+@login_required
+def dashboard_dados():
+    """Números e série do dashboard em JSON, com ETag.
+
+    A ETag junta a versão dos dados (muda a cada escrita em venda ou
+    produto) com o período pedido e o dia de hoje, então um GET repetido
+    sem mudanças responde 304 sem calcular nada.
+    """
+    inicio, fim, filtro = periodo_selecionado()
+    agrupamento = agrupamento_periodo(inicio, fim)
+
+    versao = versao_dados()
+    etag = hashlib.sha1(
+        f"{versao}|{inicio}|{fim}|{date.today()}|{agrupamento}".encode()
+    ).hexdigest()[:20]
+
+    if request.if_none_match.contains_weak(etag):
+        resposta = current_app.response_class(status=304)
+    else:
+        dados = dados_dashboard(inicio, fim, agrupamento)
+        dados["filtro"] = filtro
+        dados["inicio"] = inicio.date().isoformat()
+        dados["fim"] = (fim.date() - timedelta(days=1)).isoformat()
+        resposta = jsonify(dados)
 
-    mapa = dict(vendas_db)
+    # fraca: o corpo muda com a compressão, o conteúdo não
+    resposta.set_etag(etag, weak=True)
+    # o navegador pode guardar, mas sempre revalida com If-None-Match
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta
 
-    dias, valores = [], []
-    d = inicio.date()
 
-    while d <= fim.date():
-        chave = d.strftime("%Y-%m-%d")
-        dias.append(chave)
-        valores.append(float(mapa.get(chave, 0)))
-        d += timedelta(days=1)
+# =====================
+# ANÁLISE DE PRODUTOS
+# =====================
+# Resultados guardados por (versão dos dados, período): qualquer venda ou
+# mudança de produto troca a versão, então nada velho é servido.
+_analises = OrderedDict()
+_analises_trava = threading.Lock()
+ANALISES_GUARDADAS = 32
+ANALISE_LINHAS = 100  # na tela; o JSON traz todos os produtos
+
+# limites da curva ABC sobre a receita acumulada
+CURVA_A = 0.8
+CURVA_B = 0.95
+
+ORDENS_ANALISE = {
+    "receita": lambda linha: -linha["receita"],
+    "unidades": lambda linha: -linha["unidades"],
+    "lucro": lambda linha: -linha["lucro"],
+    "margem": lambda linha: -(linha["margem"] or 0),
+    "dias": lambda linha: (linha["dias_estoque"] is None, linha["dias_estoque"] or 0),
+}
+
+
+def calcular_analise(inicio, fim):
+    """Uma linha por produto no período [inicio, fim): unidades, receita,
+    lucro, margem, posição, classe ABC e dias de estoque.
+
+    Tudo numa consulta sobre o resumo diário (o mesmo preco_unitario e
+    preco_custo de Venda, já somados por dia), com funções de janela para
+    a posição e a receita acumulada. Produtos sem venda entram com zero
+    e classe C.
+    """
+    dias = max(1, (fim - inicio).days)
+
+    vendas = db.select(
+        VendaDiaria.produto_id,
+        func.sum(VendaDiaria.unidades).label("unidades"),
+        func.sum(VendaDiaria.receita).label("receita"),
+        func.sum(VendaDiaria.custo).label("custo")
+    ).where(
+        VendaDiaria.dia >= inicio.date(),
+        VendaDiaria.dia < fim.date()
+    ).group_by(VendaDiaria.produto_id).subquery()
+
+    unidades = func.coalesce(vendas.c.unidades, 0)
+    receita = func.coalesce(vendas.c.receita, 0)
+    lucro = receita - func.coalesce(vendas.c.custo, 0)
+    ordem = (receita.desc(), Produto.id)
+
+    total = func.sum(receita).over()
+    # receita acumulada antes deste produto, como fração do total
+    anterior = (
+        func.sum(receita).over(order_by=ordem, rows=(None, 0)) - receita
+    ) / func.nullif(total, 0)
+
+    consulta = db.select(
+        Produto.id,
+        Produto.codigo,
+        Produto.nome,
+        Produto.quantidade,
+        unidades.label("unidades"),
+        receita.label("receita"),
+        lucro.label("lucro"),
+        (lucro / func.nullif(receita, 0)).label("margem"),
+        func.rank().over(order_by=receita.desc()).label("posicao"),
+        db.case(
+            (receita <= 0, "C"),
+            (anterior < CURVA_A, "A"),
+            (anterior < CURVA_B, "B"),
+            else_="C"
+        ).label("classe"),
+        (
+            Produto.quantidade * 1.0 / func.nullif(unidades * 1.0 / dias, 0)
+        ).label("dias_estoque")
+    ).select_from(Produto).outerjoin(
+        vendas, vendas.c.produto_id == Produto.id
+    ).order_by(*ordem)
+
+    return [
+        {
+            **linha._asdict(),
+            "receita": round(linha.receita, 2),
+            "lucro": round(linha.lucro, 2),
+            "margem": None if linha.margem is None else round(linha.margem, 4),
+            "dias_estoque": (
+                None if linha.dias_estoque is None else round(linha.dias_estoque, 1)
+            ),
+        }
+        for linha in db.session.execute(consulta)
+    ]
+
+
+def analise_produtos(inicio, fim):
+    """``calcular_analise`` guardada em memória até os dados mudarem."""
+    chave = (versao_dados(), inicio, fim)
+
+    with _analises_trava:
+        if chave in _analises:
+            _analises.move_to_end(chave)
+            return _analises[chave]
+
+    linhas = calcular_analise(inicio, fim)
+
+    with _analises_trava:
+        _analises[chave] = linhas
+        # descarta o mais antigo; entradas de versões velhas saem primeiro
+        while len(_analises) > ANALISES_GUARDADAS:
+            _analises.popitem(last=False)
+
+    return linhas
+
+
+@bp.route("/analise")
+@login_required
+def analise():
+    inicio, fim, filtro = periodo_selecionado()
+    linhas = analise_produtos(inicio, fim)
+
+    ordem = request.args.get("ordem", "receita")
+    if ordem not in ORDENS_ANALISE:
+        ordem = "receita"
+    if ordem != "receita":
+        linhas = sorted(linhas, key=ORDENS_ANALISE[ordem])
+
+    classes = {"A": 0, "B": 0, "C": 0}
+    for linha in linhas:
+        classes[linha["classe"]] += 1
 
     return render_template(
-        "dashboard.html",
-        total_produtos=total_produtos,
-        total_estoque=total_estoque,
-        valor_estoque=valor_estoque,
-        vendas_dia=vendas_dia,
-        total_vendas=total_vendas,
-        lucro_total=lucro_total,
-        dias=dias,
-        valores=valores,
+        "analise.html",
+        linhas=linhas[:ANALISE_LINHAS],
+        total=len(linhas),
+        classes=classes,
+        ordem=ordem,
         filtro=filtro
     )
 
 
+@bp.route("/analise/dados")
+@login_required
+def analise_dados():
+    """Análise completa do período em JSON (?filtro=, ?data_inicio=&data_fim=)."""
+    inicio, fim, filtro = periodo_selecionado()
+    return jsonify(
+        inicio=inicio.date().isoformat(),
+        fim=(fim.date() - timedelta(days=1)).isoformat(),
+        filtro=filtro,
+        produtos=analise_produtos(inicio, fim)
+    )
+
+
 # =====================
 # PRODUTOS
 # =====================
-@app.route("/produtos")
+@bp.route("/produtos")
 @login_required
 def listar_produtos():
+    busca = request.args.get("q", "")
+    pagina = buscar_produtos(busca).paginate(
+        per_page=current_app.config["PRODUTOS_POR_PAGINA"],
+        max_per_page=200,
+        error_out=False
+    )
+
     return render_template(
         "produtos.html",
-        produtos=Produto.query.all()
+        produtos=pagina.items,
+        pagina=pagina,
+        busca=busca
     )
 
 
-@app.route("/produtos/novo", methods=["GET", "POST"])
+@bp.route("/produtos/buscar")
+@login_required
+def buscar_produtos_json():
+    """Busca para o autocomplete: ?q=termo&page=N&per_page=M."""
+    pagina = buscar_produtos(request.args.get("q")).paginate(
+        per_page=20, max_per_page=100, error_out=False
+    )
+
+    return jsonify(
+        produtos=[
+            {
+                "id": p.id,
+                "codigo": p.codigo,
+                "nome": p.nome,
+                "preco_venda": p.preco_venda,
+                "quantidade": p.quantidade,
+                "imagem": url_imagem(p.imagem, "mini") if p.imagem else None,
+            }
+            for p in pagina.items
+        ],
+        pagina=pagina.page,
+        tem_mais=pagina.has_next
+    )
+
+
+@bp.route("/produtos/novo", methods=["GET", "POST"])
 @login_required
 def novo_produto():
     if request.method == "POST":
@@ -236,11 +1570,9 @@ def novo_produto():
         except ValueError:
             return render_template("novo_produto.html", erro="Valores inválidos")
 
-        if preco_venda <= preco_custo:
-            return render_template(
-                "novo_produto.html",
-                erro="Preço de venda deve ser maior que o custo"
-            )
+        erro = validar_produto(preco_custo, preco_venda, quantidade)
+        if erro:
+            return render_template("novo_produto.html", erro=erro)
 
         produto = Produto(
             codigo=request.form["codigo"],
@@ -251,98 +1583,237 @@ def novo_produto():
         )
 
         imagem = request.files.get("imagem")
+        arquivo = None
         if imagem and imagem.filename and arquivo_permitido(imagem.filename):
-            nome_arquivo = secure_filename(imagem.filename)
-            caminho = os.path.join(app.config["UPLOAD_FOLDER"], nome_arquivo)
-            imagem.save(caminho)
-            produto.imagem = nome_arquivo
+            conteudo = imagem.read()
+            # só confere o cabeçalho aqui; redimensionar fica para a fila
+            try:
+                Image.open(io.BytesIO(conteudo)).close()
+            except (UnidentifiedImageError, OSError):
+                return render_template("novo_produto.html", erro="Imagem inválida")
+            arquivo = guardar_arquivo_tarefa(conteudo, imagem.filename.rsplit(".", 1)[1])
 
         db.session.add(produto)
+        db.session.flush()
+        registrar_movimento(produto.id, quantidade, preco_custo, "cadastro")
         db.session.commit()
-        return redirect(url_for("listar_produtos"))
+
+        if arquivo:
+            enfileirar("processar_imagem", produto_id=produto.id, arquivo=arquivo)
+
+        return redirect(url_for("loja.listar_produtos"))
 
     return render_template("novo_produto.html")
 
 # =====================
 # VENDAS
 # =====================
-@app.route("/vendas")
+@bp.route("/vendas")
 @login_required
 def listar_vendas():
-    vendas = Venda.query.order_by(Venda.data.desc()).all()
-    total = sum(v.quantidade * v.preco_unitario for v in vendas)
+    inicio, fim, filtro = periodo_selecionado(padrao=None)
+
+    por_pagina = request.args.get(
+        "por_pagina", current_app.config["VENDAS_POR_PAGINA"], type=int
+    )
+    por_pagina = max(1, min(por_pagina, 500))
+
+    # 🔹 PAGINAÇÃO POR CURSOR (data, id) — não usa OFFSET
+    cursor = request.args.get("cursor")
+    posicao = None
+    if cursor:
+        try:
+            posicao = ler_cursor(cursor)
+        except ValueError:
+            return "Cursor inválido", 400
+
+    # o arquivo só é consultado se o período chega antes do corte; cada
+    # base traz sua página pelo próprio índice e as duas são intercaladas
+    corte = corte_arquivo()
+    modelos = [Venda]
+    if corte and (inicio is None or inicio < corte):
+        modelos.append(VendaArquivada)
+
+    # total do período inteiro, pelo resumo diário da loja: o período é
+    # sempre de dias inteiros e o resumo já cobre as vendas arquivadas
+    total = db.session.query(func.coalesce(func.sum(VendaDiariaLoja.receita), 0))
+    if inicio:
+        total = total.filter(
+            VendaDiariaLoja.dia >= inicio.date(),
+            VendaDiariaLoja.dia < fim.date()
+        )
+    total = total.scalar()
+
+    vendas = []
+    for modelo in modelos:
+        consulta = modelo.query
+        if inicio:
+            consulta = consulta.filter(modelo.data >= inicio, modelo.data < fim)
+
+        if posicao:
+            consulta = consulta.filter(
+                tuple_(modelo.data, modelo.id) < tuple_(*posicao)
+            )
+
+        vendas += consulta.options(
+            joinedload(modelo.produto)
+        ).order_by(
+            modelo.data.desc(), modelo.id.desc()
+        ).limit(por_pagina + 1).all()
+
+    vendas.sort(key=lambda venda: (venda.data, venda.id), reverse=True)
+    vendas = vendas[:por_pagina + 1]
+
+    proximo_cursor = None
+    if len(vendas) > por_pagina:
+        vendas = vendas[:por_pagina]
+        ultima = vendas[-1]
+        proximo_cursor = f"{ultima.data.isoformat()}_{ultima.id}"
 
     return render_template(
         "vendas.html",
         vendas=vendas,
-        total_vendido=total
+        total_vendido=total,
+        filtro=filtro,
+        cursor=cursor,
+        proximo_cursor=proximo_cursor,
+        por_pagina=por_pagina,
+        corte=corte
     )
 
 
-@app.route("/vendas/nova", methods=["GET", "POST"])
+@bp.route("/vendas/nova", methods=["GET", "POST"])
 @login_required
 def nova_venda():
-    produtos = Produto.query.order_by(Produto.nome).all()
     hoje = date.today().strftime("%Y-%m-%d")
 
     if request.method == "POST":
-        produto = Produto.query.get_or_404(int(request.form["produto_id"]))
+        produto_id = request.form.get("produto_id", type=int)
+        if not produto_id:
+            return render_template(
+                "vendas_nova.html",
+                erro="Selecione um produto",
+                hoje=hoje
+            )
+
+        produto = Produto.query.get_or_404(produto_id)
         quantidade = int(request.form["quantidade"])
         preco = float(request.form["preco_venda"])
         data_venda = datetime.strptime(
             request.form["data_venda"], "%Y-%m-%d"
         )
 
-        if quantidade <= 0 or quantidade > produto.quantidade:
-            erro = "Quantidade inválida"
-        elif preco <= produto.preco_custo:
-            erro = "Preço abaixo do custo"
-        else:
-            produto.quantidade -= quantidade
-
-            venda = Venda(
-                produto_id=produto.id,
-                quantidade=quantidade,
-                preco_unitario=preco,
-                data=data_venda
-            )
-
-            db.session.add(venda)
+        venda, erro = registrar_venda(produto, quantidade, preco, data_venda)
+        if venda:
             db.session.commit()
-            return redirect(url_for("listar_vendas"))
+            return redirect(url_for("loja.listar_vendas"))
 
         return render_template(
             "vendas_nova.html",
-            produtos=produtos,
+            produto=produto,
             erro=erro,
             hoje=hoje
         )
 
     return render_template(
         "vendas_nova.html",
-        produtos=produtos,
         hoje=hoje
     )
 
 
-@app.route("/vendas/excluir/<int:venda_id>")
+@bp.route("/vendas/carrinho", methods=["GET", "POST"])
+@login_required
+def venda_carrinho():
+    """Venda de vários itens em uma transação só: ou todos os itens entram,
+    com a baixa de estoque de cada um, ou nenhum."""
+    hoje = date.today().strftime("%Y-%m-%d")
+
+    if request.method == "POST":
+        data_venda = datetime.strptime(request.form["data_venda"], "%Y-%m-%d")
+
+        itens = []
+        for produto_id, quantidade, preco in zip(
+            request.form.getlist("produto_id"),
+            request.form.getlist("quantidade"),
+            request.form.getlist("preco_venda")
+        ):
+            if not produto_id:
+                continue
+            try:
+                itens.append((int(produto_id), int(quantidade), float(preco)))
+            except ValueError:
+                return render_template(
+                    "vendas_carrinho.html", erro="Valores inválidos", hoje=hoje
+                )
+
+        if not itens:
+            return render_template(
+                "vendas_carrinho.html", erro="Adicione pelo menos um item", hoje=hoje
+            )
+
+        produtos = {
+            p.id: p
+            for p in Produto.query.filter(Produto.id.in_([i[0] for i in itens]))
+        }
+
+        pedido = Pedido(data=data_venda)
+        db.session.add(pedido)
+
+        erro = None
+        for numero, (produto_id, quantidade, preco) in enumerate(itens, start=1):
+            produto = produtos.get(produto_id)
+            if not produto:
+                erro = f"Item {numero}: produto não encontrado"
+                break
+
+            venda, erro = registrar_venda(produto, quantidade, preco, data_venda)
+            if erro:
+                erro = f"Item {numero} ({produto.nome}): {erro}"
+                break
+            venda.pedido = pedido
+
+        if erro:
+            db.session.rollback()
+            return render_template(
+                "vendas_carrinho.html",
+                erro=erro,
+                hoje=request.form["data_venda"],
+                itens=[
+                    (produtos.get(produto_id), quantidade, preco)
+                    for produto_id, quantidade, preco in itens
+                ]
+            )
+
+        db.session.commit()
+        return redirect(url_for("loja.listar_vendas"))
+
+    return render_template("vendas_carrinho.html", hoje=hoje)
+
+
+@bp.route("/vendas/excluir/<int:venda_id>")
 @login_required
 def excluir_venda(venda_id):
-    venda = Venda.query.get_or_404(venda_id)
+    venda = venda_alteravel(venda_id)
     produto = Produto.query.get(venda.produto_id)
 
-    produto.quantidade += venda.quantidade
+    repor_estoque(produto.id, venda.quantidade, "estorno", venda)
+    atualizar_resumo(venda, sinal=-1)
 
+    pedido = venda.pedido
     db.session.delete(venda)
+    db.session.flush()
+    if pedido and not pedido.itens:
+        db.session.delete(pedido)
+
     db.session.commit()
 
-    return redirect(url_for("listar_vendas"))
+    return redirect(url_for("loja.listar_vendas"))
 
 
-@app.route("/vendas/editar/<int:venda_id>", methods=["GET", "POST"])
+@bp.route("/vendas/editar/<int:venda_id>", methods=["GET", "POST"])
 @login_required
 def editar_venda(venda_id):
-    venda = Venda.query.get_or_404(venda_id)
+    venda = venda_alteravel(venda_id)
     produto = Produto.query.get(venda.produto_id)
 
     if request.method == "POST":
@@ -354,26 +1825,741 @@ def editar_venda(venda_id):
 
         diferenca = nova_qtd - venda.quantidade
 
-        if diferenca > produto.quantidade:
+        if periodo_arquivado(datetime.combine(nova_data, datetime.min.time())):
+            return render_template(
+                "venda_editar.html",
+                venda=venda,
+                erro="Data em período arquivado"
+            )
+
+        if not baixar_estoque(produto.id, diferenca, "edicao", venda):
             return render_template(
                 "venda_editar.html",
                 venda=venda,
                 erro="Estoque insuficiente"
             )
 
-        produto.quantidade -= diferenca
+        atualizar_resumo(venda, sinal=-1)
+
         venda.quantidade = nova_qtd
         venda.preco_unitario = novo_preco
         venda.data = datetime.combine(nova_data, datetime.min.time())
+        atualizar_resumo(venda)
 
         db.session.commit()
-        return redirect(url_for("listar_vendas"))
+        return redirect(url_for("loja.listar_vendas"))
 
     return render_template("venda_editar.html", venda=venda)
 
 
+# =====================
+# ARQUIVO DE VENDAS
+# =====================
+# ``flask arquivar-vendas`` move vendas e pedidos de meses fechados para o
+# banco anexado como ``arquivo``. O resumo diário continua no banco
+# principal e cobre os dois, então dashboard e análise não mudam; listagem,
+# exportação e reconstruir_resumo leem as duas bases.
+def corte_arquivo():
+    """Início do período aberto (None se nada foi arquivado)."""
+    return db.session.query(func.max(Arquivamento.corte)).scalar()
+
+
+def periodo_arquivado(momento):
+    corte = corte_arquivo()
+    return corte is not None and momento < corte
+
+
+def venda_alteravel(venda_id):
+    """Venda ativa ``venda_id``; 404 se não existe e 409 se é de período
+    arquivado (já movida ou com data antes do corte)."""
+    venda = db.session.get(Venda, venda_id)
+    if venda is None and db.session.get(VendaArquivada, venda_id) is None:
+        abort(404)
+    if venda is None or periodo_arquivado(venda.data):
+        abort(409, "Venda de período arquivado: não pode ser editada nem excluída.")
+    return venda
+
+
+def todas_as_vendas():
+    """Subconsulta com as vendas ativas e as arquivadas (UNION ALL). Filtros
+    de data sobre ela descem para cada lado e usam os índices."""
+    colunas = [
+        "id", "produto_id", "quantidade", "preco_unitario", "preco_custo",
+        "data", "pedido_id"
+    ]
+    return union_all(
+        db.select(*(Venda.__table__.c[nome] for nome in colunas)),
+        db.select(*(VendaArquivada.__table__.c[nome] for nome in colunas))
+    ).subquery("todas_vendas")
+
+
+def inicio_do_mes(meses_atras):
+    hoje = date.today()
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - meses_atras, 12)
+    return datetime(ano, mes + 1, 1)
+
+
+def mover_para_arquivo(modelo, arquivado, condicao, lote):
+    """Copia para o arquivo e apaga da base ativa as linhas de ``modelo``
+    que atendem ``condicao``, ``lote`` linhas por transação.
+
+    Venda e pedido são AUTOINCREMENT (garantir_ids_crescentes), então um
+    id arquivado nunca volta na base ativa.
+    """
+    tabela = modelo.__table__
+    colunas = [coluna.name for coluna in tabela.columns]
+
+    movidas = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(modelo.id)
+            .where(condicao)
+            .order_by(modelo.id)
+            .limit(lote)
+        ).all()
+        if not ids:
+            break
+
+        faixa = and_(condicao, modelo.id.between(ids[0], ids[-1]))
+        db.session.execute(
+            arquivado.__table__.insert().prefix_with("OR IGNORE").from_select(
+                colunas, db.select(*tabela.columns).where(faixa)
+            )
+        )
+        db.session.execute(db.delete(tabela).where(faixa))
+        db.session.commit()
+        movidas += len(ids)
+
+    return movidas
+
+
+def ja_arquivada(modelo, arquivado):
+    """Condição: a linha de ``modelo`` está no arquivo com todas as colunas
+    iguais, não só o id."""
+    # apelido: as duas tabelas têm o mesmo nome, em bancos diferentes
+    copia = arquivado.__table__.alias("copia").c
+    return exists().where(*(
+        copia[coluna.name].is_not_distinct_from(coluna) if coluna.nullable
+        else copia[coluna.name] == coluna
+        for coluna in modelo.__table__.columns
+    ))
+
+
+def arquivar_vendas(corte, lote):
+    """Fecha o período antes de ``corte`` e move suas vendas e pedidos
+    para o arquivo. Retorna o Arquivamento.
+
+    Em WAL o SQLite só garante cada banco separado numa queda no meio do
+    commit; por isso o começo apaga da base ativa as linhas que já chegaram
+    idênticas ao arquivo, e rodar o comando de novo completa o serviço.
+    """
+    corte = max(corte, corte_arquivo() or corte)
+
+    for modelo, arquivado in ((Venda, VendaArquivada), (Pedido, PedidoArquivado)):
+        db.session.execute(
+            db.delete(modelo.__table__).where(ja_arquivada(modelo, arquivado))
+        )
+
+    # o período fecha antes de mover: ninguém edita uma venda no meio do caminho
+    registro = Arquivamento(corte=corte)
+    db.session.add(registro)
+    db.session.commit()
+
+    registro.vendas = mover_para_arquivo(
+        Venda, VendaArquivada, Venda.data < corte, lote
+    )
+    sem_itens = ~exists().where(Venda.pedido_id == Pedido.id)
+    registro.pedidos = mover_para_arquivo(
+        Pedido, PedidoArquivado, and_(Pedido.data < corte, sem_itens), lote
+    )
+    db.session.commit()
+    return registro
+
+
+# =====================
+# IMPORTAÇÃO / EXPORTAÇÃO
+# =====================
+LOTE_IMPORTACAO = 500
+
+COLUNAS_IMPORTACAO = {
+    "produtos": ["codigo", "nome", "preco_custo", "preco_venda", "quantidade"],
+    "vendas": ["codigo", "quantidade", "preco_unitario", "data"],
+}
+
+
+def ler_planilha(arquivo, nome_arquivo):
+    """Lê um CSV (vírgula ou ponto e vírgula) ou XLSX e gera dicionários
+    com as colunas em minúsculas, uma linha por vez."""
+    if nome_arquivo.lower().endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("Para importar XLSX instale o openpyxl")
+
+        planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+        linhas = planilha.iter_rows(values_only=True)
+        cabecalho = [str(c or "").strip().lower() for c in next(linhas, [])]
+        for linha in linhas:
+            yield {
+                coluna: "" if valor is None else valor
+                for coluna, valor in zip(cabecalho, linha)
+            }
+        return
+
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    try:
+        amostra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=",;")
+        except csv.Error:
+            dialeto = csv.excel
+
+        leitor = csv.DictReader(texto, dialect=dialeto)
+        leitor.fieldnames = [c.strip().lower() for c in leitor.fieldnames or []]
+        yield from leitor
+    finally:
+        # solta o arquivo sem fechar: quem abriu continua sendo o dono
+        texto.detach()
+
+
+def ler_numero(valor, tipo=float):
+    """Aceita 10.5, "10,5" e "1.234,56"."""
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if "," in valor:
+            valor = valor.replace(".", "").replace(",", ".")
+    return tipo(valor)
+
+
+def ler_data(valor):
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime.combine(valor, datetime.min.time())
+
+    valor = str(valor or "").strip()
+    if not valor:
+        return datetime.combine(date.today(), datetime.min.time())
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            pass
+    raise ValueError
+
+
+def importar_produtos(linhas, resultado):
+    """Insere ou atualiza (pelo código) um lote de produtos."""
+    validas = {}
+    for numero, linha in linhas:
+        codigo = str(linha.get("codigo") or "").strip()
+        nome = str(linha.get("nome") or "").strip()
+        if not codigo or not nome:
+            resultado["erros"].append((numero, "Código e nome são obrigatórios"))
+            continue
+
+        try:
+            preco_custo = ler_numero(linha.get("preco_custo"))
+            preco_venda = ler_numero(linha.get("preco_venda"))
+            quantidade = ler_numero(linha.get("quantidade"), int)
+        except (TypeError, ValueError):
+            resultado["erros"].append((numero, "Valores inválidos"))
+            continue
+
+        erro = validar_produto(preco_custo, preco_venda, quantidade)
+        if erro:
+            resultado["erros"].append((numero, erro))
+            continue
+
+        validas[codigo] = dict(
+            codigo=codigo, nome=nome, preco_custo=preco_custo,
+            preco_venda=preco_venda, quantidade=quantidade
+        )
+
+    novos = []
+    for codigo, dados in validas.items():
+        # a diferença vai para o livro calculada no próprio INSERT, que já
+        # pega a trava de escrita do SQLite: até o commit nenhum caixa muda
+        # o estoque, então o UPDATE seguinte não apaga venda de ninguém
+        db.session.execute(
+            MovimentoEstoque.__table__.insert().from_select(
+                ["data", "produto_id", "quantidade", "preco_custo", "motivo"],
+                db.select(
+                    literal(datetime.now()), Produto.id,
+                    dados["quantidade"] - Produto.quantidade,
+                    literal(dados["preco_custo"]), literal("importacao")
+                ).where(
+                    Produto.codigo == codigo,
+                    # movimento de 0 unidades registra só a troca de custo
+                    or_(
+                        Produto.quantidade != dados["quantidade"],
+                        Produto.preco_custo != dados["preco_custo"]
+                    )
+                )
+            )
+        )
+        atualizado = db.session.execute(
+            update(Produto)
+            .where(Produto.codigo == codigo)
+            .values(**dados)
+            .returning(Produto.id)
+        ).scalar()
+
+        if atualizado:
+            resultado["atualizados"] += 1
+        else:
+            produto = Produto(**dados)
+            db.session.add(produto)
+            novos.append(produto)
+            resultado["inseridos"] += 1
+
+    db.session.flush()
+    for produto in novos:
+        registrar_movimento(
+            produto.id, produto.quantidade, produto.preco_custo, "importacao"
+        )
+
+
+def importar_vendas(linhas, resultado):
+    """Registra um lote de vendas com as mesmas regras da tela de venda."""
+    codigos = {str(linha.get("codigo") or "").strip() for _, linha in linhas}
+    produtos = {
+        p.codigo: p
+        for p in Produto.query.filter(Produto.codigo.in_(list(codigos)))
+    }
+
+    for numero, linha in linhas:
+        produto = produtos.get(str(linha.get("codigo") or "").strip())
+        if not produto:
+            resultado["erros"].append((numero, "Produto não encontrado"))
+            continue
+
+        try:
+            quantidade = ler_numero(linha.get("quantidade"), int)
+            preco = ler_numero(linha.get("preco_unitario"))
+            data_venda = ler_data(linha.get("data"))
+        except (TypeError, ValueError):
+            resultado["erros"].append((numero, "Valores inválidos"))
+            continue
+
+        venda, erro = registrar_venda(produto, quantidade, preco, data_venda)
+        if venda:
+            resultado["inseridos"] += 1
+        else:
+            resultado["erros"].append((numero, erro))
+
 
-@app.route("/configuracoes", methods=["GET", "POST"])
+def importar(tipo, linhas):
+    """Importa produtos ou vendas em lotes de LOTE_IMPORTACAO linhas, um
+    commit por lote. Linhas com erro são puladas e listadas no resultado
+    com o número da linha na planilha (o cabeçalho é a linha 1)."""
+    processar = {"produtos": importar_produtos, "vendas": importar_vendas}[tipo]
+    resultado = {"inseridos": 0, "atualizados": 0, "erros": []}
+
+    lote = []
+    for numero, linha in enumerate(linhas, start=2):
+        lote.append((numero, linha))
+        if len(lote) >= LOTE_IMPORTACAO:
+            processar(lote, resultado)
+            db.session.commit()
+            lote = []
+
+    if lote:
+        processar(lote, resultado)
+        db.session.commit()
+
+    return resultado
+
+
+@bp.route("/importar", methods=["GET", "POST"])
+@login_required
+def importar_planilha():
+    if request.method == "POST":
+        tipo = request.form.get("tipo")
+        arquivo = request.files.get("arquivo")
+
+        if tipo not in COLUNAS_IMPORTACAO or not arquivo or not arquivo.filename:
+            return render_template(
+                "importar.html",
+                colunas=COLUNAS_IMPORTACAO,
+                erro="Escolha o tipo e o arquivo"
+            )
+
+        # o arquivo vai para o disco e a importação para a fila
+        extensao = "xlsx" if arquivo.filename.lower().endswith(".xlsx") else "csv"
+        nova = enfileirar(
+            "importar", tipo=tipo, nome_arquivo=arquivo.filename,
+            arquivo=guardar_arquivo_tarefa(arquivo.read(), extensao)
+        )
+        return redirect(url_for("loja.importar_planilha", tarefa=nova.id))
+
+    acompanhada = None
+    tarefa_id = request.args.get("tarefa", type=int)
+    if tarefa_id:
+        acompanhada = db.session.get(Tarefa, tarefa_id)
+
+    resultado = None
+    if acompanhada and acompanhada.resultado and acompanhada.resultado.dados:
+        resultado = json.loads(acompanhada.resultado.dados)
+
+    return render_template(
+        "importar.html",
+        colunas=COLUNAS_IMPORTACAO,
+        tarefa=acompanhada,
+        resultado=resultado,
+        em_fila=current_app.config["TAREFAS_EM_FILA"]
+    )
+
+
+def resposta_csv(nome_arquivo, cabecalho, linhas):
+    """Resposta CSV gerada linha a linha; nada fica inteiro na memória."""
+    def gerar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+
+        buffer.write("\ufeff")  # BOM: o Excel abre os acentos certo
+        escritor.writerow(cabecalho)
+        for linha in linhas:
+            escritor.writerow(linha)
+            if buffer.tell() > 16384:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(gerar()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={nome_arquivo}"}
+    )
+
+
+def dados_exportacao(tipo, inicio=None, fim=None):
+    """(nome do arquivo, cabeçalho, linhas) da exportação; as linhas vêm
+    do banco aos poucos. ``inicio``/``fim`` filtram as vendas."""
+    if tipo == "produtos":
+        consulta = db.session.query(
+            Produto.codigo, Produto.nome, Produto.preco_custo,
+            Produto.preco_venda, Produto.quantidade
+        ).order_by(Produto.codigo).execution_options(yield_per=1000)
+        return "produtos.csv", COLUNAS_IMPORTACAO["produtos"], consulta
+
+    vendas = todas_as_vendas()
+    consulta = db.select(
+        Produto.codigo, vendas.c.quantidade, vendas.c.preco_unitario,
+        vendas.c.data, Produto.nome
+    ).join_from(vendas, Produto, Produto.id == vendas.c.produto_id)
+    if inicio:
+        consulta = consulta.where(vendas.c.data >= inicio, vendas.c.data < fim)
+    consulta = consulta.order_by(
+        vendas.c.data, vendas.c.id
+    ).execution_options(yield_per=1000)
+
+    linhas = (
+        (codigo, quantidade, preco, data_venda.strftime("%Y-%m-%d"), nome)
+        for codigo, quantidade, preco, data_venda, nome in db.session.execute(consulta)
+    )
+    return "vendas.csv", COLUNAS_IMPORTACAO["vendas"] + ["nome"], linhas
+
+
+@bp.route("/exportar/produtos.csv")
+@login_required
+def exportar_produtos():
+    return resposta_csv(*dados_exportacao("produtos"))
+
+
+@bp.route("/exportar/vendas.csv")
+@login_required
+def exportar_vendas():
+    inicio, fim, _ = periodo_selecionado(padrao=None)
+    return resposta_csv(*dados_exportacao("vendas", inicio, fim))
+
+
+@bp.route("/exportar/<tipo>", methods=["POST"])
+@login_required
+def exportar_em_fila(tipo):
+    """Gera o CSV no trabalhador; a página acompanha e oferece o download."""
+    if tipo not in COLUNAS_IMPORTACAO:
+        abort(404)
+
+    nova = enfileirar(
+        "exportar", tipo=tipo,
+        data_inicio=request.form.get("data_inicio") or None,
+        data_fim=request.form.get("data_fim") or None
+    )
+    return redirect(url_for("loja.importar_planilha", tarefa=nova.id))
+
+
+# =====================
+# TAREFAS EM SEGUNDO PLANO
+# =====================
+# Fila na própria base SQLite, sem broker. Com TAREFAS_EM_FILA=1 as rotas
+# só enfileiram e o ``flask trabalhador`` executa; sem isso, enfileirar()
+# executa na hora, no próprio request (desenvolvimento, sem trabalhador).
+TAREFAS = {}
+
+
+class ErroTarefa(Exception):
+    """Falha definitiva: a tarefa vai para ``falhou`` sem novas tentativas."""
+
+
+def tarefa(tipo, tentativas=3):
+    """Registra a função que executa as tarefas de ``tipo``.
+
+    A função recebe os parâmetros do enfileirar() e pode devolver um dict
+    (guardado como JSON) ou um ResultadoTarefa com arquivo.
+    """
+    def registrar(funcao):
+        TAREFAS[tipo] = (funcao, tentativas)
+        return funcao
+    return registrar
+
+
+def enfileirar(tipo, /, **parametros):
+    """Grava a tarefa (commit) e devolve o objeto. ``parametros`` precisa
+    ser serializável em JSON."""
+    _, tentativas = TAREFAS[tipo]
+    nova = Tarefa(
+        tipo=tipo,
+        parametros=json.dumps(parametros),
+        max_tentativas=tentativas,
+        usuario_id=(
+            current_user.id
+            if has_request_context() and current_user.is_authenticated else None
+        )
+    )
+    db.session.add(nova)
+    db.session.commit()
+
+    if not current_app.config["TAREFAS_EM_FILA"]:
+        # sem trabalhador: executa já, repetindo sem espera se falhar
+        while pegar_tarefa("request", nova.id):
+            executar_tarefa(nova.id)
+
+    return nova
+
+
+def pegar_tarefa(trabalhador, tarefa_id=None):
+    """Marca como ``executando`` a próxima tarefa disponível (ou a
+    ``tarefa_id``, se pendente) e devolve o id, ou None.
+
+    Um único UPDATE ... RETURNING: dois trabalhadores nunca pegam a mesma.
+    """
+    agora = datetime.now()
+    proxima = db.select(Tarefa.id).where(Tarefa.estado == "pendente")
+    if tarefa_id:
+        proxima = proxima.where(Tarefa.id == tarefa_id)
+    else:
+        proxima = proxima.where(
+            Tarefa.disponivel_em <= agora
+        ).order_by(Tarefa.disponivel_em, Tarefa.id).limit(1)
+
+    pegou = db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == proxima.scalar_subquery(), Tarefa.estado == "pendente")
+        .values(
+            estado="executando",
+            iniciada_em=agora,
+            trabalhador=trabalhador,
+            tentativas=Tarefa.tentativas + 1
+        )
+        .returning(Tarefa.id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    db.session.commit()
+    return pegou
+
+
+def executar_tarefa(tarefa_id):
+    """Roda uma tarefa já pega e grava o estado final ou agenda a próxima
+    tentativa, com espera dobrando a cada falha."""
+    atual = db.session.get(Tarefa, tarefa_id)
+    funcao, _ = TAREFAS[atual.tipo]
+    parametros = json.loads(atual.parametros)
+
+    try:
+        resultado = funcao(**parametros)
+    except Exception as erro:
+        db.session.rollback()
+        current_app.logger.exception("tarefa %s (%s) falhou", tarefa_id, atual.tipo)
+
+        atual = db.session.get(Tarefa, tarefa_id)
+        atual.erro = f"{type(erro).__name__}: {erro}"
+        if isinstance(erro, ErroTarefa) or atual.tentativas >= atual.max_tentativas:
+            atual.estado = "falhou"
+            atual.concluida_em = datetime.now()
+        else:
+            espera = current_app.config["TAREFAS_ESPERA"] * 2 ** (atual.tentativas - 1)
+            atual.estado = "pendente"
+            atual.disponivel_em = datetime.now() + timedelta(seconds=espera)
+    else:
+        atual = db.session.get(Tarefa, tarefa_id)
+        atual.estado = "concluida"
+        atual.concluida_em = datetime.now()
+        atual.erro = None
+        if isinstance(resultado, ResultadoTarefa):
+            atual.resultado = resultado
+        elif resultado is not None:
+            atual.resultado = ResultadoTarefa(dados=json.dumps(resultado))
+
+    db.session.commit()
+
+
+def recuperar_tarefas_presas():
+    """Devolve à fila tarefas ``executando`` há mais de TAREFAS_TEMPO_LIMITE
+    segundos (trabalhador morto no meio)."""
+    limite = datetime.now() - timedelta(seconds=current_app.config["TAREFAS_TEMPO_LIMITE"])
+    presas = and_(Tarefa.estado == "executando", Tarefa.iniciada_em < limite)
+
+    Tarefa.query.filter(presas, Tarefa.tentativas >= Tarefa.max_tentativas).update(
+        {"estado": "falhou", "erro": "Tempo esgotado", "concluida_em": datetime.now()},
+        synchronize_session=False
+    )
+    Tarefa.query.filter(presas).update(
+        {"estado": "pendente", "disponivel_em": datetime.now()},
+        synchronize_session=False
+    )
+    db.session.commit()
+
+
+def limpar_tarefas():
+    """Apaga tarefas encerradas há mais de TAREFAS_RETENCAO_DIAS e arquivos
+    temporários esquecidos."""
+    limite = datetime.now() - timedelta(days=current_app.config["TAREFAS_RETENCAO_DIAS"])
+    antigas = db.select(Tarefa.id).where(
+        Tarefa.estado.in_(["concluida", "falhou"]), Tarefa.concluida_em < limite
+    )
+
+    ResultadoTarefa.query.filter(ResultadoTarefa.tarefa_id.in_(antigas)).delete(
+        synchronize_session=False
+    )
+    Tarefa.query.filter(Tarefa.id.in_(antigas)).delete(synchronize_session=False)
+    db.session.commit()
+
+    pasta = current_app.config["TAREFAS_PASTA"]
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        if datetime.fromtimestamp(os.path.getmtime(caminho)) < limite:
+            os.remove(caminho)
+
+
+def guardar_arquivo_tarefa(conteudo, extensao):
+    """Grava um upload em TAREFAS_PASTA para o trabalhador ler depois."""
+    nome = f"{uuid.uuid4().hex}.{extensao.lower()}"
+    gravar_arquivo(os.path.join(current_app.config["TAREFAS_PASTA"], nome), conteudo)
+    return nome
+
+
+@tarefa("processar_imagem")
+def processar_imagem_tarefa(produto_id, arquivo):
+    """Gera as versões da imagem enviada no cadastro e liga ao produto."""
+    caminho = os.path.join(current_app.config["TAREFAS_PASTA"], arquivo)
+    with open(caminho, "rb") as entrada:
+        conteudo = entrada.read()
+
+    try:
+        nome = salvar_imagem(conteudo, arquivo.rsplit(".", 1)[1])
+    except UnidentifiedImageError:
+        os.remove(caminho)
+        raise ErroTarefa("Imagem inválida")
+
+    produto = db.session.get(Produto, produto_id)
+    if produto:
+        produto.imagem = nome
+        db.session.commit()
+
+    os.remove(caminho)
+    return {"imagem": nome}
+
+
+# importar vendas de novo duplicaria as já gravadas: sem segunda tentativa
+@tarefa("importar", tentativas=1)
+def importar_tarefa(tipo, arquivo, nome_arquivo):
+    caminho = os.path.join(current_app.config["TAREFAS_PASTA"], arquivo)
+    try:
+        with open(caminho, "rb") as entrada:
+            return importar(tipo, ler_planilha(entrada, nome_arquivo))
+    except (ValueError, UnicodeDecodeError, csv.Error) as erro:
+        raise ErroTarefa(f"Arquivo inválido: {erro}")
+    finally:
+        os.remove(caminho)
+
+
+@tarefa("exportar")
+def exportar_tarefa(tipo, data_inicio=None, data_fim=None):
+    inicio = fim = None
+    if data_inicio and data_fim:
+        inicio = datetime.strptime(data_inicio, "%Y-%m-%d")
+        fim = datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1)
+
+    nome_arquivo, cabecalho, linhas = dados_exportacao(tipo, inicio, fim)
+
+    # linha a linha direto no disco: a exportação não passa inteira pela
+    # memória nem pelo banco
+    arquivo = f"{uuid.uuid4().hex}.csv"
+    caminho = os.path.join(current_app.config["TAREFAS_PASTA"], arquivo)
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8-sig", newline="") as saida:
+        escritor = csv.writer(saida)
+        escritor.writerow(cabecalho)
+        escritor.writerows(linhas)
+    os.replace(temporario, caminho)
+
+    return ResultadoTarefa(
+        caminho=arquivo,
+        nome_arquivo=nome_arquivo,
+        mimetype="text/csv"
+    )
+
+
+@bp.route("/tarefas")
+@login_required
+def listar_tarefas():
+    tarefas = Tarefa.query.order_by(Tarefa.id.desc()).limit(50).all()
+    return render_template("tarefas.html", tarefas=tarefas)
+
+
+@bp.route("/tarefas/<int:tarefa_id>")
+@login_required
+def estado_tarefa(tarefa_id):
+    """Estado da tarefa em JSON, para a página consultar até terminar."""
+    atual = Tarefa.query.get_or_404(tarefa_id)
+    resultado = atual.resultado
+
+    return jsonify(
+        id=atual.id,
+        tipo=atual.tipo,
+        estado=atual.estado,
+        tentativas=atual.tentativas,
+        erro=atual.erro,
+        criada_em=atual.criada_em.isoformat(),
+        concluida_em=atual.concluida_em.isoformat() if atual.concluida_em else None,
+        dados=json.loads(resultado.dados) if resultado and resultado.dados else None,
+        arquivo=(
+            url_for("loja.baixar_resultado_tarefa", tarefa_id=atual.id)
+            if resultado and resultado.caminho else None
+        )
+    )
+
+
+@bp.route("/tarefas/<int:tarefa_id>/resultado")
+@login_required
+def baixar_resultado_tarefa(tarefa_id):
+    resultado = ResultadoTarefa.query.get_or_404(tarefa_id)
+    if not resultado.caminho:
+        abort(404)
+
+    return send_from_directory(
+        current_app.config["TAREFAS_PASTA"],
+        resultado.caminho,
+        mimetype=resultado.mimetype,
+        as_attachment=True,
+        download_name=resultado.nome_arquivo
+    )
+
+
+@bp.route("/configuracoes", methods=["GET", "POST"])
 @login_required
 def configuracoes():
     config = Configuracao.query.first()  # pega a única configuração
@@ -385,6 +2571,7 @@ def configuracoes():
         config.cor_perigo = request.form.get("cor_perigo", config.cor_perigo)
 
         db.session.commit()
+        invalidar_cache()
         sucesso = "Configurações salvas com sucesso!"
         return render_template("configuracoes.html", config=config, sucesso=sucesso)
 
@@ -394,14 +2581,14 @@ def configuracoes():
 # =====================
 # USUÁRIOS
 # =====================
-@app.route("/configuracoes/usuarios")
+@bp.route("/configuracoes/usuarios")
 @login_required
 def configuracoes_usuarios():
     usuarios = Usuario.query.all()
     return render_template("configuracoes_usuarios.html", usuarios=usuarios)
 
 
-@app.route("/configuracoes/usuarios/novo", methods=["POST"])
+@bp.route("/configuracoes/usuarios/novo", methods=["POST"])
 @login_required
 def novo_usuario():
     usuario = request.form.get("usuario")
@@ -425,10 +2612,11 @@ def novo_usuario():
         )
     )
     db.session.commit()
-    return redirect(url_for("configuracoes_usuarios"))
+    invalidar_cache()
+    return redirect(url_for("loja.configuracoes_usuarios"))
 
 
-@app.route("/configuracoes/usuarios/editar/<int:user_id>", methods=["GET", "POST"])
+@bp.route("/configuracoes/usuarios/editar/<int:user_id>", methods=["GET", "POST"])
 @login_required
 def editar_usuario(user_id):
     usuario = Usuario.query.get_or_404(user_id)
@@ -444,18 +2632,27 @@ def editar_usuario(user_id):
         if nova_senha and nova_senha != nova_senha_confirm:
             return "Senhas não conferem", 400
 
+        # trocar nome ou senha derruba as sessões abertas desse usuário
+        if novo_nome != usuario.usuario or nova_senha:
+            usuario.versao_sessao = (usuario.versao_sessao or 0) + 1
+
         # Atualiza
         usuario.usuario = novo_nome
         if nova_senha:
             usuario.senha = generate_password_hash(nova_senha)
 
         db.session.commit()
-        return redirect(url_for("configuracoes_usuarios"))
+        invalidar_cache()
+
+        # quem alterou o próprio usuário continua logado nesta sessão
+        if usuario.id == current_user.id:
+            session.update(dados_sessao(usuario))
+        return redirect(url_for("loja.configuracoes_usuarios"))
 
     return render_template("editar_usuario.html", usuario=usuario)
 
 
-@app.route("/configuracoes/usuarios/excluir/<int:user_id>")
+@bp.route("/configuracoes/usuarios/excluir/<int:user_id>")
 @login_required
 def excluir_usuario(user_id):
     usuario = Usuario.query.get_or_404(user_id)
@@ -466,25 +2663,368 @@ def excluir_usuario(user_id):
 
     db.session.delete(usuario)
     db.session.commit()
-    return redirect(url_for("configuracoes_usuarios"))
+    invalidar_cache()
+    return redirect(url_for("loja.configuracoes_usuarios"))
 
 
 
-@app.context_processor
+@bp.app_context_processor
 def inject_config():
-    config = Configuracao.query.first()
+    config = cache_obter("config", lambda: Configuracao.query.first())
     return dict(config=config)
 
 
 
+# =====================
+# ARQUIVOS ESTÁTICOS
+# =====================
+# ``flask construir-assets`` copia static/ (menos uploads/) para
+# static/dist/ com o hash do conteúdo no nome, mais versões .gz e .br, e
+# grava o manifesto. Os templates usam asset("style.css"); sem build
+# (desenvolvimento) o arquivo original é servido.
+PASTAS_FORA_DO_BUILD = {"uploads", "dist"}
+EXTENSOES_COMPRIMIVEIS = {".css", ".js", ".svg", ".json", ".txt", ".ttf", ".map"}
+URL_CSS = re.compile(r"""url\((['"]?)([^'")]+)\1\)""")
+
+_manifesto = None
+
+
+def nome_com_hash(caminho, conteudo):
+    raiz, extensao = posixpath.splitext(caminho)
+    return f"{raiz}.{hashlib.sha256(conteudo).hexdigest()[:12]}{extensao}"
+
+
+def reescrever_urls_css(css, caminho, manifesto):
+    """Troca url(...) relativas do CSS pelos nomes com hash já gerados."""
+    pasta = posixpath.dirname(caminho)
+
+    def trocar(achado):
+        url = achado.group(2)
+        if url.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return achado.group(0)
+
+        alvo = re.split(r"[?#]", url, maxsplit=1)[0]
+        sufixo = url[len(alvo):]  # ?v=... ou #iefix
+        destino = manifesto.get(posixpath.normpath(posixpath.join(pasta, alvo)))
+        if not destino:
+            return achado.group(0)
+        return f"url({posixpath.relpath(destino, pasta or '.')}{sufixo})"
+
+    return URL_CSS.sub(trocar, css)
+
+
+def construir_assets():
+    """Gera static/dist e o manifesto. Retorna o manifesto.
+
+    CSS vai por último, para as url() apontarem para fontes e imagens já
+    com hash. Arquivos antigos ficam, para páginas abertas antes do deploy.
+    """
+    origem = current_app.static_folder
+    destino = current_app.config["ASSETS_PASTA"]
+
+    arquivos = []
+    for pasta, subpastas, nomes in os.walk(origem):
+        if pasta == origem:
+            subpastas[:] = [s for s in subpastas if s not in PASTAS_FORA_DO_BUILD]
+        for nome in nomes:
+            relativo = os.path.relpath(os.path.join(pasta, nome), origem)
+            arquivos.append(relativo.replace(os.sep, "/"))
+    arquivos.sort(key=lambda caminho: (caminho.endswith(".css"), caminho))
+
+    manifesto = {}
+    for caminho in arquivos:
+        with open(os.path.join(origem, caminho), "rb") as arquivo:
+            conteudo = arquivo.read()
+        if caminho.endswith(".css"):
+            conteudo = reescrever_urls_css(
+                conteudo.decode("utf-8"), caminho, manifesto
+            ).encode("utf-8")
+
+        final = nome_com_hash(caminho, conteudo)
+        manifesto[caminho] = final
+
+        saida = os.path.join(destino, final)
+        if os.path.exists(saida):
+            continue
+        os.makedirs(os.path.dirname(saida), exist_ok=True)
+        gravar_arquivo(saida, conteudo)
+
+        if posixpath.splitext(caminho)[1] not in EXTENSOES_COMPRIMIVEIS:
+            continue
+        gz = gzip.compress(conteudo, compresslevel=9, mtime=0)
+        if len(gz) < len(conteudo):
+            gravar_arquivo(saida + ".gz", gz)
+        if brotli:
+            br = brotli.compress(conteudo, quality=11)
+            if len(br) < len(conteudo):
+                gravar_arquivo(saida + ".br", br)
+
+    gravar_arquivo(
+        os.path.join(destino, "manifest.json"),
+        json.dumps(manifesto, indent=2, sort_keys=True).encode("utf-8")
+    )
+    return manifesto
+
+
+def manifesto_assets():
+    """Manifesto lido uma vez por processo ({} se não houver build)."""
+    global _manifesto
+
+    if _manifesto is None:
+        try:
+            with open(os.path.join(current_app.config["ASSETS_PASTA"], "manifest.json")) as arquivo:
+                _manifesto = json.load(arquivo)
+        except FileNotFoundError:
+            _manifesto = {}
+    return _manifesto
+
+
+@bp.app_template_global()
+def asset(caminho):
+    """URL do arquivo de static/, na versão com hash quando há build."""
+    final = manifesto_assets().get(caminho)
+    if final:
+        return url_for("loja.asset_construido", arquivo=final)
+    return url_for("static", filename=caminho)
+
+
+@bp.route("/static/dist/<path:arquivo>")
+def asset_construido(arquivo):
+    """Serve static/dist com cache imutável e, se o navegador aceitar, a
+    versão .br ou .gz já comprimida."""
+    pasta = current_app.config["ASSETS_PASTA"]
+    tipo = mimetypes.guess_type(arquivo)[0] or "application/octet-stream"
+
+    for codificacao, extensao in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[codificacao] and os.path.isfile(
+            os.path.join(pasta, arquivo + extensao)
+        ):
+            resposta = send_from_directory(pasta, arquivo + extensao, mimetype=tipo)
+            resposta.headers["Content-Encoding"] = codificacao
+            break
+    else:
+        resposta = send_from_directory(pasta, arquivo, mimetype=tipo)
+
+    resposta.vary.add("Accept-Encoding")
+    resposta.cache_control.no_cache = None
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = 31536000
+    resposta.cache_control.immutable = True
+    return resposta
+
+
+@bp.after_app_request
+def comprimir_resposta(resposta):
+    """Comprime páginas HTML e JSON (brotli se houver, senão gzip).
+
+    Arquivos e respostas em streaming (CSV) passam direto.
+    """
+    if (
+        not current_app.config["COMPRIMIR_RESPOSTAS"]
+        or resposta.direct_passthrough
+        or resposta.is_streamed
+        or resposta.status_code != 200
+        or "Content-Encoding" in resposta.headers
+        or resposta.mimetype not in ("text/html", "application/json")
+    ):
+        return resposta
+
+    dados = resposta.get_data()
+    if len(dados) < current_app.config["COMPRIMIR_MINIMO"]:
+        return resposta
+
+    resposta.vary.add("Accept-Encoding")
+    aceitas = request.accept_encodings
+    if brotli and aceitas["br"]:
+        resposta.set_data(brotli.compress(dados, quality=5))
+        resposta.headers["Content-Encoding"] = "br"
+    elif aceitas["gzip"]:
+        resposta.set_data(gzip.compress(dados, compresslevel=6))
+        resposta.headers["Content-Encoding"] = "gzip"
+    return resposta
+
+
+# =====================
+# INSTRUMENTAÇÃO (opt-in: PERFIL=1)
+# =====================
+# Cada worker guarda as últimas PERFIL_AMOSTRAS requisições em memória.
+_amostras = deque(maxlen=1000)
+_amostras_trava = threading.Lock()
+
+
+def ativar_perfil(app):
+    """Mede por requisição: consultas SQL, tempo de SQL, de template e total.
+
+    Consultas com o mesmo SQL repetidas PERFIL_LIMITE_N1 vezes ou mais numa
+    requisição são marcadas como suspeitas de N+1.
+    """
+    global _amostras
+    _amostras = deque(maxlen=app.config["PERFIL_AMOSTRAS"])
+
+    @app.before_request
+    def iniciar_perfil():
+        g.perfil = {
+            "inicio": time.perf_counter(),
+            "consultas": Counter(),
+            "tempo_sql": 0.0,
+            "tempo_render": 0.0,
+        }
+
+    @app.after_request
+    def registrar_perfil(resposta):
+        perfil = g.pop("perfil", None)
+        if perfil is None:
+            return resposta
+
+        limite = app.config["PERFIL_LIMITE_N1"]
+        amostra = {
+            "rota": request.endpoint or request.path,
+            "metodo": request.method,
+            "status": resposta.status_code,
+            "consultas": sum(perfil["consultas"].values()),
+            "tempo_sql": perfil["tempo_sql"] * 1000,
+            "tempo_render": perfil["tempo_render"] * 1000,
+            "tempo_total": (time.perf_counter() - perfil["inicio"]) * 1000,
+            "n1": [
+                (" ".join(sql.split())[:200], vezes)
+                for sql, vezes in perfil["consultas"].items()
+                if vezes >= limite
+            ],
+        }
+
+        with _amostras_trava:
+            _amostras.append(amostra)
+
+        if app.config["PERFIL_LOG"]:
+            app.logger.info(json.dumps(amostra, ensure_ascii=False))
+
+        return resposta
+
+    @before_render_template.connect_via(app)
+    def inicio_render(sender, template, context, **extra):
+        if "perfil" in g:
+            g.perfil["render_inicio"] = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def fim_render(sender, template, context, **extra):
+        if "perfil" in g and "render_inicio" in g.perfil:
+            g.perfil["tempo_render"] += time.perf_counter() - g.perfil.pop("render_inicio")
+
+    with app.app_context():
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def inicio_consulta(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("perfil_inicio", []).append(time.perf_counter())
+
+        @event.listens_for(db.engine, "after_cursor_execute")
+        def fim_consulta(conn, cursor, statement, parameters, context, executemany):
+            inicio = conn.info["perfil_inicio"].pop()
+            if has_request_context() and "perfil" in g:
+                g.perfil["consultas"][statement] += 1
+                g.perfil["tempo_sql"] += time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo; ``valores`` ordenados."""
+    if not valores:
+        return 0.0
+    posicao = max(0, min(len(valores) - 1, math.ceil(p * len(valores) / 100) - 1))
+    return valores[posicao]
+
+
+def resumo_perfil():
+    """Agrupa as amostras guardadas por rota."""
+    with _amostras_trava:
+        amostras = list(_amostras)
+
+    por_rota = {}
+    for amostra in amostras:
+        por_rota.setdefault((amostra["metodo"], amostra["rota"]), []).append(amostra)
+
+    resumo = []
+    for (metodo, rota), lista in sorted(por_rota.items()):
+        tempos = sorted(a["tempo_total"] for a in lista)
+        n1 = Counter()
+        for amostra in lista:
+            for sql, vezes in amostra["n1"]:
+                n1[sql] = max(n1[sql], vezes)
+
+        resumo.append({
+            "metodo": metodo,
+            "rota": rota,
+            "requisicoes": len(lista),
+            "p50": percentil(tempos, 50),
+            "p95": percentil(tempos, 95),
+            "p99": percentil(tempos, 99),
+            "consultas": sum(a["consultas"] for a in lista) / len(lista),
+            "tempo_sql": sum(a["tempo_sql"] for a in lista) / len(lista),
+            "tempo_render": sum(a["tempo_render"] for a in lista) / len(lista),
+            "n1": n1.most_common(),
+        })
+
+    return resumo
+
+
+@bp.app_template_global()
+def ve_desempenho():
+    """O usuário logado está em PERFIL_USUARIOS (pelo id, não pelo nome)."""
+    return (
+        current_user.is_authenticated
+        and int(current_user.get_id()) in current_app.config["PERFIL_USUARIOS"]
+    )
+
+
+@bp.route("/configuracoes/desempenho")
+@login_required
+def configuracoes_desempenho():
+    if not ve_desempenho():
+        abort(403)
+
+    return render_template(
+        "configuracoes_desempenho.html",
+        ativo=current_app.config["PERFIL_ATIVO"],
+        resumo=resumo_perfil(),
+        ultimas=list(_amostras)[-20:][::-1]
+    )
+
+
 # =====================
 # INIT
 # =====================
-with app.app_context():
-    os.makedirs("database", exist_ok=True)
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+def create_app():
+    """Cria o app. Não mexe no banco: tabelas, índices e dados iniciais
+    ficam em ``flask --app app inicializar-banco``, rodado uma vez por
+    deploy, e não em cada worker que importa o módulo."""
+    app = Flask(__name__)
+    configurar(app)
+
+    proxies = app.config["PROXIES_CONFIAVEIS"]
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def ao_conectar(dbapi_connection, connection_record):
+            configurar_sqlite(dbapi_connection, app.config)
+            anexar_arquivo(dbapi_connection, app.config)
+
+    if app.config["PERFIL_ATIVO"]:
+        ativar_perfil(app)
+
+    return app
+
+
+def inicializar_banco():
+    """Cria pastas, tabelas e índices e os dados iniciais. Idempotente."""
+    os.makedirs(os.path.join(BASE_DIR, "database"), exist_ok=True)
+    os.makedirs(current_app.config["UPLOAD_FOLDER"], exist_ok=True)
+    os.makedirs(current_app.config["TAREFAS_PASTA"], exist_ok=True)
 
     db.create_all()
+    migrar_banco()
 
     if not Usuario.query.filter_by(usuario="admin").first():
         db.session.add(
@@ -497,7 +3037,300 @@ with app.app_context():
 
     if not Configuracao.query.first():
         db.session.add(Configuracao())
-        db.session.commit()    
+        db.session.commit()
+
+    # banco antigo: preenche os resumos diários na primeira execução
+    if not VendaDiariaLoja.query.first() and (
+        VendaDiaria.query.first() or Venda.query.first()
+    ):
+        reconstruir_resumo()
+
+    # banco antigo: saldo de abertura do livro de estoque e primeira foto
+    if abrir_livro_estoque():
+        tirar_foto_estoque()
+
+
+@bp.cli.command("inicializar-banco")
+def inicializar_banco_comando():
+    """Cria/migra o banco (flask --app app inicializar-banco)."""
+    inicializar_banco()
+    print("Banco pronto.")
+
+
+@bp.cli.command("reconstruir-resumo")
+def reconstruir_resumo_comando():
+    """Recalcula o resumo diário de vendas (flask reconstruir-resumo)."""
+    reconstruir_resumo()
+    print(
+        f"Resumo recalculado: {VendaDiaria.query.count()} linhas por produto, "
+        f"{VendaDiariaLoja.query.count()} dias."
+    )
+
+
+@bp.cli.command("construir-assets")
+def construir_assets_comando():
+    """Gera static/dist com nomes por hash e versões .gz/.br
+    (rodar a cada deploy, depois de mudar CSS/JS)."""
+    manifesto = construir_assets()
+    print(f"{len(manifesto)} arquivos em {current_app.config['ASSETS_PASTA']}.")
+    if not brotli:
+        print("Brotli não instalado: só versões .gz.")
+
+
+@bp.cli.command("trabalhador")
+@click.option("--uma-vez", is_flag=True, help="Sai quando a fila esvaziar.")
+def trabalhador_comando(uma_vez):
+    """Executa as tarefas da fila até receber SIGTERM/Ctrl+C
+    (flask --app app trabalhador). Pode rodar mais de um."""
+    nome = f"{socket.gethostname()}:{os.getpid()}"
+    parar = threading.Event()
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sinal, lambda *_: parar.set())
+
+    print(f"Trabalhador {nome} esperando tarefas.")
+    ultima_limpeza = ultima_recuperacao = 0
+
+    while not parar.is_set():
+        # cada recuperação grava no banco: uma vez por minuto basta
+        if time.monotonic() - ultima_recuperacao > 60:
+            recuperar_tarefas_presas()
+            ultima_recuperacao = time.monotonic()
+        tarefa_id = pegar_tarefa(nome)
+
+        if tarefa_id is None:
+            if uma_vez:
+                break
+            if time.monotonic() - ultima_limpeza > 3600:
+                limpar_tarefas()
+                ultima_limpeza = time.monotonic()
+            parar.wait(current_app.config["TAREFAS_INTERVALO"])
+            continue
+
+        # a tarefa em andamento termina antes de sair
+        executar_tarefa(tarefa_id)
+        db.session.remove()
+
+    print(f"Trabalhador {nome} encerrado.")
+
+
+@bp.cli.command("arquivar-vendas")
+@click.option("--meses", type=int,
+              help="Arquiva o que for anterior ao início do mês de N meses "
+                   "atrás (padrão: ARQUIVO_MESES).")
+@click.option("--compactar", is_flag=True,
+              help="Roda VACUUM no banco principal depois, para liberar espaço.")
+def arquivar_vendas_comando(meses, compactar):
+    """Move vendas de meses fechados para o banco de arquivo, em lotes
+    (flask arquivar-vendas --meses 12). Pode rodar de novo sem problema."""
+    if meses is None:
+        meses = current_app.config["ARQUIVO_MESES"]
+
+    registro = arquivar_vendas(inicio_do_mes(meses), current_app.config["ARQUIVO_LOTE"])
+    print(
+        f"Período antes de {registro.corte:%d/%m/%Y} arquivado: "
+        f"{registro.vendas} vendas e {registro.pedidos} pedidos movidos."
+    )
+
+    if compactar:
+        with db.engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as conn:
+            conn.exec_driver_sql("VACUUM main")
+        print("Banco principal compactado.")
+
+
+@bp.cli.command("foto-estoque")
+def foto_estoque_comando():
+    """Grava uma foto do estoque (agendar no cron, ex.: todo dia à noite)
+    para a posição em datas passadas somar poucos movimentos."""
+    foto = tirar_foto_estoque()
+    if foto is None:
+        print("Nenhum movimento desde a última foto.")
+    else:
+        print(f"Foto {foto.id} gravada até o movimento {foto.movimento_id}.")
+
+
+@bp.cli.command("posicao-estoque")
+@click.argument("data", required=False)
+def posicao_estoque_comando(data):
+    """Unidades e valor a custo do estoque no fim do dia DATA (AAAA-MM-DD),
+    ou agora (flask posicao-estoque 2025-12-31)."""
+    momento = None
+    if data:
+        momento = datetime.strptime(data, "%Y-%m-%d") + timedelta(days=1)
+
+    posicao = valor_estoque_em(momento)
+    if posicao is None:
+        print("O livro de estoque começa depois dessa data.")
+        sys.exit(1)
+
+    unidades, valor = posicao
+    print(f"{unidades} unidades, R$ {valor:.2f} a custo.")
+
+
+@bp.cli.command("verificar-estoque")
+@click.option("--completo", is_flag=True,
+              help="Soma o livro inteiro em vez de partir da última foto.")
+@click.option("--corrigir", is_flag=True,
+              help="Lança movimentos de ajuste para igualar o livro ao produto.")
+def verificar_estoque_comando(completo, corrigir):
+    """Confere o livro de estoque contra Produto.quantidade e sai com
+    código 1 se houver diferença (e não for --corrigir)."""
+    if completo:
+        livro = dict(db.session.query(
+            MovimentoEstoque.produto_id, func.sum(MovimentoEstoque.quantidade)
+        ).group_by(MovimentoEstoque.produto_id).all())
+    else:
+        livro = {
+            produto_id: quantidade
+            for produto_id, (quantidade, _) in (estoque_em(datetime.max) or {}).items()
+        }
+
+    diferencas = 0
+    for produto in Produto.query.order_by(Produto.id):
+        esperado = livro.get(produto.id, 0)
+        if esperado == produto.quantidade:
+            continue
+
+        diferencas += 1
+        print(
+            f"{produto.codigo}: produto tem {produto.quantidade}, "
+            f"livro soma {esperado}"
+        )
+        if corrigir:
+            registrar_movimento(
+                produto.id, produto.quantidade - esperado,
+                produto.preco_custo, "ajuste"
+            )
+
+    db.session.commit()
+    print(f"{len(livro)} produtos no livro, {diferencas} com diferença.")
+    if diferencas and not corrigir:
+        sys.exit(1)
+
+
+@bp.cli.command("processar-imagens")
+def processar_imagens_comando():
+    """Passa as imagens já existentes em static/uploads pelo mesmo
+    processamento do upload e atualiza os produtos que as usam."""
+    pasta = current_app.config["UPLOAD_FOLDER"]
+
+    for nome in sorted(os.listdir(pasta)):
+        if not arquivo_permitido(nome) or not os.path.isfile(os.path.join(pasta, nome)):
+            continue
+        if "_" in nome and NOME_HASH.match(nome):
+            continue  # já é uma versão reduzida
+
+        with open(os.path.join(pasta, nome), "rb") as arquivo:
+            conteudo = arquivo.read()
+
+        try:
+            novo_nome = salvar_imagem(conteudo, nome.rsplit(".", 1)[1])
+        except (UnidentifiedImageError, OSError):
+            print(f"ignorada (não é imagem): {nome}")
+            continue
+
+        if novo_nome != nome:
+            atualizados = Produto.query.filter_by(imagem=nome).update(
+                {"imagem": novo_nome}
+            )
+            print(f"{nome} -> {novo_nome} ({atualizados} produtos)")
+
+    db.session.commit()
+
+
+@bp.cli.command("importar")
+@click.argument("tipo", type=click.Choice(list(COLUNAS_IMPORTACAO)))
+@click.argument("arquivo", type=click.Path(exists=True, dir_okay=False))
+def importar_comando(tipo, arquivo):
+    """Importa produtos ou vendas de um CSV/XLSX
+    (flask importar produtos catalogo.csv)."""
+    with open(arquivo, "rb") as entrada:
+        resultado = importar(tipo, ler_planilha(entrada, arquivo))
+
+    print(
+        f"{resultado['inseridos']} inseridos, {resultado['atualizados']} "
+        f"atualizados, {len(resultado['erros'])} linhas com erro."
+    )
+    for numero, erro in resultado["erros"]:
+        print(f"  linha {numero}: {erro}")
+
+
+def verificar_indices():
+    """Roda EXPLAIN QUERY PLAN nas consultas do dashboard, da análise e das
+    listagens de vendas e produtos.
+
+    Retorna (número de consultas, varreduras), com uma tupla (detalhe do
+    plano, SQL) para cada varredura completa de venda ou venda_diaria.
+    venda_diaria_loja fica de fora: tem uma linha por dia.
+    """
+    urls = [
+        "/dashboard/dados?filtro=hoje",
+        "/dashboard/dados?filtro=7",
+        "/dashboard/dados?filtro=30",
+        "/dashboard/dados?data_inicio=2024-01-01&data_fim=2024-12-31",
+        "/dashboard/dados?data_inicio=2020-01-01&data_fim=2024-12-31",
+        "/analise/dados?filtro=30",
+        "/vendas",
+        f"/vendas?cursor={datetime.now().isoformat()}_1",
+        "/vendas?filtro=30",
+        "/vendas?data_inicio=2024-01-01&data_fim=2024-12-31",
+        f"/vendas?filtro=30&cursor={datetime.now().isoformat()}_1",
+        "/produtos",
+        "/produtos?page=2",
+    ]
+
+    consultas = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            consultas.append((statement, parameters))
+
+    admin = Usuario.query.filter_by(usuario="admin").first()
+    cliente = current_app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao["_user_id"] = str(admin.id)
+        sessao["_fresh"] = True
+        sessao.update(dados_sessao(admin))
+
+    event.listen(db.engine, "before_cursor_execute", capturar)
+    try:
+        for url in urls:
+            cliente.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capturar)
+
+    varredura = re.compile(r"^SCAN (venda|venda_diaria)\b")
+    varreduras = []
+
+    with db.engine.connect() as conn:
+        for statement, parameters in consultas:
+            plano = conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + statement, parameters
+            ).all()
+            for linha in plano:
+                detalhe = linha[-1]
+                if varredura.match(detalhe) and "INDEX" not in detalhe:
+                    varreduras.append((detalhe, statement))
+
+    return len(consultas), varreduras
+
+
+@bp.cli.command("verificar-indices")
+def verificar_indices_comando():
+    """Falha se alguma consulta das telas principais varrer venda ou
+    venda_diaria inteira (flask verificar-indices)."""
+    total, varreduras = verificar_indices()
+    for detalhe, statement in varreduras:
+        print(f"VARREDURA COMPLETA: {detalhe}\n  {statement}\n")
+
+    print(f"{total} consultas verificadas, {len(varreduras)} varreduras completas.")
+    if varreduras:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        inicializar_banco()
     app.run(debug=True)
@@ -0,0 +1,41 @@
+"""Configuração do gunicorn para produção.
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+O banco deve ser criado/migrado antes, uma vez: flask --app app inicializar-banco
+"""
+import multiprocessing
+import os
+
+# em produção uploads, importações e exportações vão para a fila, executada
+# pelo "flask --app app trabalhador" (linha worker do Procfile)
+os.environ.setdefault("TAREFAS_EM_FILA", "1")
+
+# atrás do roteador da hospedagem: o IP do cliente (usado no limite de
+# logins) vem do X-Forwarded-For que ele acrescenta
+os.environ.setdefault("PROXIES_CONFIAVEIS", "1")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# gthread: cada processo atende várias requisições enquanto outras esperam
+# o SQLite ou o disco. Processos contornam o GIL.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# carrega o app uma vez no processo mestre e faz fork dos workers: sobe mais
+# rápido e economiza memória. create_app() não abre conexões com o banco,
+# então nenhuma conexão é herdada pelo fork.
+preload_app = True
+
+# conexões HTTP reaproveitadas entre requisições do mesmo navegador
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+
+# recicla workers de tempos em tempos para conter vazamentos de memória
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
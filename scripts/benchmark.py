@@ -0,0 +1,207 @@
+"""Benchmark reproduzível das rotas principais, com saída em JSON.
+
+Gera um banco sintético novo (scripts/gerar_dados.py, sempre com a mesma
+semente), abre cada cenário pelo cliente de teste do Flask e mede latência
+(p50/p95/p99) e pico de memória alocada pelo Python (tracemalloc) por
+cenário. O JSON inclui o commit atual, para comparar rodadas:
+
+    python scripts/benchmark.py antes.json
+    git checkout outra-branch
+    COMPARAR=antes.json python scripts/benchmark.py depois.json
+
+Opções por variável de ambiente: PRODUTOS (padrão 1000), VENDAS (100000),
+ANOS (2), REPETICOES (30 por cenário), SEMENTE (42) e BANCO (usa um banco
+já gerado em vez de criar um temporário).
+"""
+import json
+import os
+import platform
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from comum import RAIZ, carregar_app, cliente_logado
+from gerar_dados import gerar
+from app import percentil
+
+AQUECIMENTO = 3
+
+
+def cenarios(cliente, produto_id, preco):
+    """Lista de (nome, função que faz uma requisição e devolve a resposta,
+    status esperado)."""
+    hoje = date.today()
+    noventa = (hoje - timedelta(days=89)).isoformat()
+    um_ano = (hoje - timedelta(days=364)).isoformat()
+    tudo = (hoje - timedelta(days=365 * 10)).isoformat()
+    fim = hoje.isoformat()
+
+    # a segunda página da listagem de vendas precisa do cursor da primeira
+    pagina = cliente.get("/vendas").get_data(as_text=True)
+    achado = re.search(r"cursor=([^\"&]+)", pagina)
+    cursor = achado.group(1) if achado else ""
+
+    def obter(url):
+        return lambda: cliente.get(url)
+
+    def revalidar(url):
+        etag = cliente.get(url).headers["ETag"]
+        return lambda: cliente.get(url, headers={"If-None-Match": etag})
+
+    def vender():
+        return cliente.post("/vendas/nova", data={
+            "produto_id": produto_id, "quantidade": 1,
+            "preco_venda": preco, "data_venda": fim,
+        })
+
+    return [
+        ("dashboard", obter("/dashboard"), 200),
+        ("dashboard hoje", obter("/dashboard/dados?filtro=hoje"), 200),
+        ("dashboard 7", obter("/dashboard/dados?filtro=7"), 200),
+        ("dashboard 30", obter("/dashboard/dados?filtro=30"), 200),
+        ("dashboard 90 dias", obter(f"/dashboard/dados?data_inicio={noventa}&data_fim={fim}"), 200),
+        ("dashboard 1 ano", obter(f"/dashboard/dados?data_inicio={um_ano}&data_fim={fim}"), 200),
+        ("dashboard tudo", obter(f"/dashboard/dados?data_inicio={tudo}&data_fim={fim}"), 200),
+        ("dashboard 304", revalidar("/dashboard/dados?filtro=30"), 304),
+        ("análise 30", obter("/analise?filtro=30"), 200),
+        ("análise 1 ano", obter(f"/analise/dados?data_inicio={um_ano}&data_fim={fim}"), 200),
+        ("vendas", obter("/vendas"), 200),
+        ("vendas página 2", obter(f"/vendas?cursor={cursor}"), 200),
+        ("vendas 30", obter("/vendas?filtro=30"), 200),
+        ("vendas 1 ano", obter(f"/vendas?data_inicio={um_ano}&data_fim={fim}"), 200),
+        ("produtos", obter("/produtos"), 200),
+        ("produtos página 5", obter("/produtos?page=5"), 200),
+        ("produtos busca", obter("/produtos?q=camiseta"), 200),
+        ("nova venda (form)", obter("/vendas/nova"), 200),
+        # a venda só conta se gravou (redirect); o formulário de volta é erro
+        ("nova venda (post)", vender, 302),
+    ]
+
+
+def medir(requisicao, esperado, repeticoes):
+    for _ in range(AQUECIMENTO):
+        requisicao()
+
+    tempos = []
+    erros = 0
+    tracemalloc.start()
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = requisicao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        if resposta.status_code != esperado:
+            erros += 1
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tempos.sort()
+    return {
+        "repeticoes": repeticoes,
+        "erros": erros,
+        "p50_ms": round(percentil(tempos, 50), 3),
+        "p95_ms": round(percentil(tempos, 95), 3),
+        "p99_ms": round(percentil(tempos, 99), 3),
+        "media_ms": round(sum(tempos) / len(tempos), 3),
+        "max_ms": round(tempos[-1], 3),
+        "memoria_pico_kb": round(pico / 1024, 1),
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=RAIZ,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(anterior, atual):
+    print(f"\ncomparado com {anterior.get('commit')} (p50 e p95, ms)")
+    for nome, novo in atual["cenarios"].items():
+        velho = anterior["cenarios"].get(nome)
+        if not velho:
+            continue
+        variacao = (novo["p50_ms"] - velho["p50_ms"]) / velho["p50_ms"] * 100
+        print(
+            f"{nome:<22}{velho['p50_ms']:>9.2f} -> {novo['p50_ms']:<9.2f}"
+            f"{variacao:>+7.1f}%   p95 {velho['p95_ms']:.2f} -> {novo['p95_ms']:.2f}"
+        )
+
+
+def main():
+    produtos = int(os.environ.get("PRODUTOS", 1000))
+    vendas = int(os.environ.get("VENDAS", 100000))
+    anos = float(os.environ.get("ANOS", 2))
+    repeticoes = int(os.environ.get("REPETICOES", 30))
+    semente = int(os.environ.get("SEMENTE", 42))
+    saida = sys.argv[1] if len(sys.argv) > 1 else None
+
+    banco = os.environ.get("BANCO")
+    gerar_banco = not banco
+    if gerar_banco:
+        banco = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+
+    inicio = time.perf_counter()
+    loja, app = carregar_app(f"sqlite:///{os.path.abspath(banco)}")
+    app.logger.disabled = True
+    if gerar_banco:
+        with app.app_context():
+            gerar(loja, produtos, vendas, anos, semente)
+    tempo_geracao = time.perf_counter() - inicio
+
+    cliente = cliente_logado(loja, app)
+    # o produto da venda recebe estoque para o aquecimento e as repetições
+    with app.app_context():
+        produto_id, preco = loja.db.session.query(
+            loja.Produto.id, loja.Produto.preco_venda
+        ).order_by(loja.Produto.id).first()
+        loja.repor_estoque(produto_id, AQUECIMENTO + repeticoes, "ajuste")
+        loja.db.session.commit()
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "parametros": {
+            "produtos": produtos, "vendas": vendas, "anos": anos,
+            "semente": semente, "repeticoes": repeticoes,
+            "banco": None if gerar_banco else banco,
+        },
+        "preparo_s": round(tempo_geracao, 2),
+        "cenarios": {},
+    }
+
+    print(f"{'cenário':<22}{'p50':>9}{'p95':>9}{'p99':>9}{'mem kB':>10}{'erros':>7}")
+    for nome, requisicao, esperado in cenarios(cliente, produto_id, preco):
+        medida = medir(requisicao, esperado, repeticoes)
+        resultado["cenarios"][nome] = medida
+        print(
+            f"{nome:<22}{medida['p50_ms']:>9.2f}{medida['p95_ms']:>9.2f}"
+            f"{medida['p99_ms']:>9.2f}{medida['memoria_pico_kb']:>10.0f}"
+            f"{medida['erros']:>7}"
+        )
+
+    # ru_maxrss vem em kB no Linux
+    resultado["rss_pico_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if saida:
+        with open(saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"\nresultado salvo em {saida}")
+
+    if os.environ.get("COMPARAR"):
+        with open(os.environ["COMPARAR"], encoding="utf-8") as arquivo:
+            comparar(json.load(arquivo), resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark de leitura e escrita concorrentes no SQLite.
+
+Roda a mesma carga duas vezes, em bancos novos: sem os ajustes de conexão
+(SQLITE_TUNING=0, journal padrão) e com eles (WAL, synchronous=NORMAL,
+busy_timeout, mmap e cache maior). Leitores abrem /dashboard/dados e /vendas,
+escritores registram vendas, todos ao mesmo tempo por DURACAO segundos.
+
+Uso:
+    python scripts/benchmark_sqlite.py [leitores] [escritores] [duracao_s]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from comum import carregar_app, cliente_logado
+
+PRODUTOS = 200
+VENDAS_INICIAIS = 5000
+
+
+def preparar(url_banco, tuning):
+    loja, app = carregar_app(url_banco, SQLITE_TUNING=tuning)
+    with app.app_context():
+        produtos = [
+            loja.Produto(
+                codigo=f"P{i:05d}", nome=f"Produto {i}",
+                preco_custo=10, preco_venda=20, quantidade=10 ** 6
+            )
+            for i in range(PRODUTOS)
+        ]
+        loja.db.session.add_all(produtos)
+        loja.db.session.commit()
+        produto_ids = [p.id for p in produtos]
+
+        agora = datetime.now()
+        loja.db.session.add_all(
+            loja.Venda(
+                produto_id=produto_ids[i % PRODUTOS],
+                quantidade=1,
+                preco_unitario=25,
+                preco_custo=10,
+                data=agora - timedelta(minutes=i * 7)
+            )
+            for i in range(VENDAS_INICIAIS)
+        )
+        loja.db.session.commit()
+        loja.reconstruir_resumo()
+
+    return produto_ids
+
+
+def trabalhar(url_banco, tuning, papel, produto_ids, duracao, barreira, fila):
+    loja, app = carregar_app(url_banco, SQLITE_TUNING=tuning)
+    app.logger.disabled = True
+    cliente = cliente_logado(loja, app)
+    hoje = date.today().strftime("%Y-%m-%d")
+
+    barreira.wait()
+    fim = time.perf_counter() + duracao
+    ops = erros = 0
+    i = 0
+
+    while time.perf_counter() < fim:
+        i += 1
+        if papel == "leitor":
+            url = "/dashboard/dados?filtro=30" if i % 2 else "/vendas"
+            resposta = cliente.get(url)
+            ok = resposta.status_code == 200
+        else:
+            resposta = cliente.post("/vendas/nova", data={
+                "produto_id": produto_ids[i % len(produto_ids)],
+                "quantidade": 1, "preco_venda": 25, "data_venda": hoje,
+            })
+            ok = resposta.status_code == 302
+
+        if ok:
+            ops += 1
+        else:
+            erros += 1
+
+    fila.put((papel, ops, erros))
+
+
+def rodar(tuning, leitores, escritores, duracao):
+    pasta = tempfile.mkdtemp()
+    url_banco = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+
+    contexto = multiprocessing.get_context("spawn")
+
+    # prepara em processo próprio para o import do app ler SQLITE_TUNING
+    with contexto.Pool(1) as pool:
+        produto_ids = pool.apply(preparar, (url_banco, tuning))
+
+    total = leitores + escritores
+    barreira = contexto.Barrier(total)
+    fila = contexto.Queue()
+    papeis = ["leitor"] * leitores + ["escritor"] * escritores
+
+    filhos = [
+        contexto.Process(
+            target=trabalhar,
+            args=(url_banco, tuning, papel, produto_ids, duracao, barreira, fila)
+        )
+        for papel in papeis
+    ]
+    for filho in filhos:
+        filho.start()
+    resultados = [fila.get() for _ in filhos]
+    for filho in filhos:
+        filho.join()
+
+    resumo = {}
+    for papel, ops, erros in resultados:
+        atual = resumo.setdefault(papel, [0, 0])
+        atual[0] += ops
+        atual[1] += erros
+    return resumo
+
+
+def main():
+    leitores = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    escritores = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    duracao = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    print(f"{leitores} leitores, {escritores} escritores, {duracao:.0f}s por rodada\n")
+    print(f"{'modo':<12}{'leituras/s':>12}{'escritas/s':>12}{'erros':>8}")
+
+    for tuning, nome in (("0", "padrão"), ("1", "ajustado")):
+        resumo = rodar(tuning, leitores, escritores, duracao)
+        leituras, erros_l = resumo.get("leitor", [0, 0])
+        escritas, erros_e = resumo.get("escritor", [0, 0])
+        print(
+            f"{nome:<12}{leituras / duracao:>12.1f}{escritas / duracao:>12.1f}"
+            f"{erros_l + erros_e:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Teste de carga HTTP em /dashboard/dados e /produtos.
+
+Aponte para um ou mais servidores já rodando e compare, por exemplo, o
+servidor de desenvolvimento com o gunicorn:
+
+    python app.py                                          # porta 5000
+    gunicorn -c gunicorn.conf.py "app:create_app()"        # porta 8000
+    python scripts/carga_http.py http://127.0.0.1:5000 http://127.0.0.1:8000
+
+Opções por variável de ambiente: CLIENTES (conexões simultâneas, padrão 16),
+DURACAO (segundos por alvo, padrão 15), USUARIO e SENHA (admin/123).
+"""
+import http.cookiejar
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import comum  # põe a raiz do projeto no sys.path
+from app import percentil
+
+# /dashboard só desenha a página; os números vêm de /dashboard/dados
+ROTAS = ["/dashboard/dados?filtro=30", "/produtos"]
+
+
+def abrir_sessao(base):
+    cookies = http.cookiejar.CookieJar()
+    abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies))
+    dados = urllib.parse.urlencode({
+        "usuario": os.environ.get("USUARIO", "admin"),
+        "senha": os.environ.get("SENHA", "123"),
+    }).encode()
+    abridor.open(base + "/", dados).read()
+    return abridor
+
+
+def cliente(base, fim, tempos, erros, trava):
+    try:
+        abridor = abrir_sessao(base)
+    except OSError as erro:
+        print(f"{base}: não foi possível entrar ({erro})", file=sys.stderr)
+        return
+
+    i = 0
+    while time.perf_counter() < fim:
+        rota = ROTAS[i % len(ROTAS)]
+        i += 1
+        inicio = time.perf_counter()
+        try:
+            with abridor.open(base + rota) as resposta:
+                resposta.read()
+            ok = resposta.status == 200
+        except OSError:
+            ok = False
+        duracao = time.perf_counter() - inicio
+
+        with trava:
+            if ok:
+                tempos[rota].append(duracao)
+            else:
+                erros[rota] += 1
+
+
+def medir(base, clientes, duracao):
+    tempos = {rota: [] for rota in ROTAS}
+    erros = {rota: 0 for rota in ROTAS}
+    trava = threading.Lock()
+    fim = time.perf_counter() + duracao
+
+    threads = [
+        threading.Thread(target=cliente, args=(base, fim, tempos, erros, trava))
+        for _ in range(clientes)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return tempos, erros
+
+
+def main():
+    alvos = sys.argv[1:] or ["http://127.0.0.1:8000"]
+    clientes = int(os.environ.get("CLIENTES", 16))
+    duracao = float(os.environ.get("DURACAO", 15))
+
+    print(f"{clientes} clientes, {duracao:.0f}s por alvo\n")
+    print(f"{'alvo':<28}{'rota':<28}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'erros':>7}")
+
+    for base in alvos:
+        base = base.rstrip("/")
+        tempos, erros = medir(base, clientes, duracao)
+        for rota in ROTAS:
+            valores = sorted(tempos[rota])
+            print(
+                f"{base:<28}{rota:<28}{len(valores) / duracao:>9.1f}"
+                f"{percentil(valores, 50) * 1000:>9.1f}"
+                f"{percentil(valores, 95) * 1000:>9.1f}{erros[rota]:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Funções compartilhadas pelos scripts de teste de carga e benchmark."""
+import os
+import sys
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# os scripts importam o app (e funções dele, como percentil) da raiz
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+def carregar_app(url_banco, **ambiente):
+    """Cria um app apontando para ``url_banco``, com o banco inicializado.
+
+    Variáveis extras (ex.: SQLITE_TUNING="0") vão para o ambiente antes,
+    pois a configuração é lida ao criar o app. Retorna (módulo, app).
+    """
+    os.environ["DATABASE_URL"] = url_banco
+    os.environ.update(ambiente)
+    import app as loja
+
+    app = loja.create_app()
+    with app.app_context():
+        loja.inicializar_banco()
+    return loja, app
+
+
+def cliente_logado(loja, app, usuario="admin"):
+    """Cliente de teste do Flask já autenticado como ``usuario``."""
+    cliente = app.test_client()
+    with app.app_context():
+        user = loja.Usuario.query.filter_by(usuario=usuario).first()
+    with cliente.session_transaction() as sessao:
+        sessao["_user_id"] = str(user.id)
+        sessao["_fresh"] = True
+        sessao.update(loja.dados_sessao(user))
+    return cliente
@@ -0,0 +1,98 @@
+"""Teste de estresse: vários processos vendendo o mesmo produto ao mesmo tempo.
+
+Cria um banco temporário com um produto de estoque ESTOQUE, dispara
+PROCESSOS processos que tentam vender 1 unidade VENDAS_POR_PROCESSO vezes
+cada e confere que o estoque nunca fica negativo nem é vendido a mais.
+
+Uso:
+    python scripts/estresse_estoque.py [processos] [vendas_por_processo] [estoque]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+from datetime import date
+
+from comum import carregar_app, cliente_logado
+
+
+def vender(url_banco, produto_id, vezes, barreira, fila):
+    loja, app = carregar_app(url_banco)
+    cliente = cliente_logado(loja, app)
+    hoje = date.today().strftime("%Y-%m-%d")
+
+    barreira.wait()
+
+    ok = recusadas = erros = 0
+    for _ in range(vezes):
+        resposta = cliente.post("/vendas/nova", data={
+            "produto_id": produto_id,
+            "quantidade": 1,
+            "preco_venda": 20,
+            "data_venda": hoje,
+        })
+        if resposta.status_code == 302:
+            ok += 1
+        elif resposta.status_code == 200:
+            recusadas += 1
+        else:
+            erros += 1
+
+    fila.put((ok, recusadas, erros))
+
+
+def main():
+    processos = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    vezes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    estoque = int(sys.argv[3]) if len(sys.argv) > 3 else 25
+
+    pasta = tempfile.mkdtemp()
+    url_banco = f"sqlite:///{os.path.join(pasta, 'estresse.db')}"
+
+    loja, app = carregar_app(url_banco)
+    with app.app_context():
+        produto = loja.Produto(
+            codigo="ESTRESSE", nome="Produto de teste",
+            preco_custo=10, preco_venda=20, quantidade=estoque
+        )
+        loja.db.session.add(produto)
+        loja.db.session.commit()
+        produto_id = produto.id
+
+    contexto = multiprocessing.get_context("spawn")
+    barreira = contexto.Barrier(processos)
+    fila = contexto.Queue()
+
+    filhos = [
+        contexto.Process(
+            target=vender, args=(url_banco, produto_id, vezes, barreira, fila)
+        )
+        for _ in range(processos)
+    ]
+    for filho in filhos:
+        filho.start()
+    resultados = [fila.get() for _ in filhos]
+    for filho in filhos:
+        filho.join()
+
+    ok = sum(r[0] for r in resultados)
+    recusadas = sum(r[1] for r in resultados)
+    erros = sum(r[2] for r in resultados)
+
+    with app.app_context():
+        restante = loja.db.session.get(loja.Produto, produto_id).quantidade
+        vendido = loja.db.session.query(
+            loja.func.coalesce(loja.func.sum(loja.Venda.quantidade), 0)
+        ).filter(loja.Venda.produto_id == produto_id).scalar()
+
+    print(f"vendas aceitas: {ok}  recusadas: {recusadas}  erros: {erros}")
+    print(f"estoque inicial: {estoque}  vendido: {vendido}  restante: {restante}")
+
+    assert restante >= 0, "estoque ficou negativo"
+    assert vendido == ok, "vendas gravadas diferem das aceitas"
+    assert vendido + restante == estoque, "estoque vendido a mais"
+    print("OK: nenhuma unidade vendida a mais.")
+
+
+if __name__ == "__main__":
+    main()
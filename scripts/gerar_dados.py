@@ -0,0 +1,167 @@
+"""Gera um banco SQLite novo com dados sintéticos de loja.
+
+Produtos têm popularidade desigual (poucos campeões de venda, cauda longa),
+e as vendas se espalham pelos últimos ANOS com crescimento ao longo do
+tempo, mais movimento no fim de semana e em dezembro, e concentração no
+horário comercial. Parte dos atendimentos vira um Pedido com vários itens.
+A mesma SEMENTE gera sempre os mesmos dados.
+
+Uso:
+    python scripts/gerar_dados.py destino.db [produtos] [vendas] [anos]
+
+Opções por variável de ambiente: SEMENTE (padrão 42).
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from comum import carregar_app
+
+LOTE = 10000
+
+PECAS = [
+    "Camiseta", "Blusa", "Vestido", "Saia", "Calça", "Short", "Jaqueta",
+    "Moletom", "Regata", "Macacão", "Cardigã", "Body", "Pijama", "Meia",
+]
+CORES = [
+    "Branca", "Preta", "Azul", "Rosa", "Verde", "Vermelha", "Amarela",
+    "Lilás", "Bege", "Cinza", "Estampada", "Listrada",
+]
+TAMANHOS = ["PP", "P", "M", "G", "GG", "2", "4", "6", "8", "10"]
+
+# peso relativo de cada dia da semana (segunda = 0) e de cada hora
+PESO_DIA_SEMANA = [0.8, 0.85, 0.9, 1.0, 1.25, 1.6, 0.65]
+PESO_HORA = {
+    9: 0.5, 10: 0.9, 11: 1.1, 12: 1.4, 13: 1.3, 14: 0.9,
+    15: 0.9, 16: 1.0, 17: 1.3, 18: 1.5, 19: 1.1, 20: 0.6,
+}
+
+
+def gerar_produtos(rng, quantidade):
+    produtos = []
+    for i in range(1, quantidade + 1):
+        custo = round(rng.lognormvariate(3.4, 0.5), 2)
+        produtos.append({
+            "id": i,
+            "codigo": f"P{i:06d}",
+            "nome": f"{rng.choice(PECAS)} {rng.choice(CORES)} {rng.choice(TAMANHOS)}",
+            "preco_custo": custo,
+            "preco_venda": round(round(custo * rng.uniform(1.6, 2.5)) - 0.1, 2),
+            "quantidade": rng.randint(0, 200),
+        })
+    return produtos
+
+
+def pesos_dias(dias):
+    """Crescimento linear de 60% a 140%, sazonalidade semanal e dezembro."""
+    pesos = []
+    for i, dia in enumerate(dias):
+        peso = 0.6 + 0.8 * i / max(1, len(dias) - 1)
+        peso *= PESO_DIA_SEMANA[dia.weekday()]
+        if dia.month == 12:
+            peso *= 1.8
+        pesos.append(peso)
+    return pesos
+
+
+def gerar(loja, produtos, vendas, anos, semente=42):
+    """Preenche o banco do app atual; chamar dentro do app context.
+
+    Retorna o número de pedidos criados. Não baixa o estoque: as vendas
+    geradas são histórico.
+    """
+    rng = random.Random(semente)
+    db = loja.db
+
+    lista_produtos = gerar_produtos(rng, produtos)
+    for inicio in range(0, len(lista_produtos), LOTE):
+        db.session.execute(db.insert(loja.Produto), lista_produtos[inicio:inicio + LOTE])
+
+    # popularidade tipo Zipf, embaralhada para não seguir o id
+    ids = [p["id"] for p in lista_produtos]
+    rng.shuffle(ids)
+    pesos_produtos = [1 / (posicao + 1) ** 1.1 for posicao in range(len(ids))]
+    precos = {p["id"]: p["preco_venda"] for p in lista_produtos}
+    custos = {p["id"]: p["preco_custo"] for p in lista_produtos}
+
+    hoje = date.today()
+    dias = [hoje - timedelta(days=n) for n in range(int(365 * anos) - 1, -1, -1)]
+    pesos = pesos_dias(dias)
+    horas = list(PESO_HORA)
+    pesos_hora = list(PESO_HORA.values())
+
+    linhas = []
+    pedidos = []
+    geradas = 0
+    while geradas < vendas:
+        dia = rng.choices(dias, pesos)[0]
+        momento = datetime.combine(dia, datetime.min.time()) + timedelta(
+            hours=rng.choices(horas, pesos_hora)[0],
+            minutes=rng.randrange(60),
+            seconds=rng.randrange(60),
+        )
+
+        # 15% dos atendimentos levam de 2 a 4 peças num mesmo pedido
+        itens = 1 if rng.random() < 0.85 else rng.randint(2, 4)
+        itens = min(itens, vendas - geradas)
+        pedido_id = None
+        if itens > 1:
+            pedido_id = len(pedidos) + 1
+            pedidos.append({"id": pedido_id, "data": momento})
+
+        for produto_id in rng.choices(ids, pesos_produtos, k=itens):
+            desconto = 1 if rng.random() < 0.8 else rng.choice([0.95, 0.9, 0.8])
+            linhas.append({
+                "produto_id": produto_id,
+                "quantidade": rng.choices([1, 2, 3, 4, 5], [70, 18, 7, 3, 2])[0],
+                "preco_unitario": round(precos[produto_id] * desconto, 2),
+                "preco_custo": custos[produto_id],
+                "data": momento,
+                "pedido_id": pedido_id,
+            })
+        geradas += itens
+
+    # insere em ordem de data, como aconteceria na loja
+    linhas.sort(key=lambda linha: linha["data"])
+    for inicio in range(0, len(pedidos), LOTE):
+        db.session.execute(db.insert(loja.Pedido), pedidos[inicio:inicio + LOTE])
+    for inicio in range(0, len(linhas), LOTE):
+        db.session.execute(db.insert(loja.Venda), linhas[inicio:inicio + LOTE])
+    db.session.commit()
+
+    loja.reconstruir_resumo()
+    loja.abrir_livro_estoque()
+    loja.tirar_foto_estoque()
+    return len(pedidos)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    destino = os.path.abspath(sys.argv[1])
+    produtos = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    vendas = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+    anos = float(sys.argv[4]) if len(sys.argv) > 4 else 2
+    semente = int(os.environ.get("SEMENTE", 42))
+
+    if os.path.exists(destino):
+        print(f"{destino} já existe; o gerador só preenche um banco novo.")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    loja, app = carregar_app(f"sqlite:///{destino}")
+    with app.app_context():
+        pedidos = gerar(loja, produtos, vendas, anos, semente)
+
+    print(
+        f"{destino}: {produtos} produtos, {vendas} vendas ({pedidos} pedidos) "
+        f"em {anos:g} anos, {time.perf_counter() - inicio:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+/* Autocomplete de produtos das telas de venda.
+ *
+ * campo: <input> de texto dentro de um .busca-produto que também tem um
+ * <ul class="busca-resultados">. aoEscolher(produto) é chamado quando um
+ * resultado é clicado; aoLimpar() quando o texto muda.
+ */
+function ligarBuscaProduto(campo, url, aoEscolher, aoLimpar) {
+    const lista = campo.parentElement.querySelector('.busca-resultados');
+
+    let espera = null;
+    let pagina = 1;
+    let termo = '';
+
+    function item(p) {
+        const li = document.createElement('li');
+        li.textContent = `${p.codigo} — ${p.nome} (Estoque: ${p.quantidade})`;
+        li.addEventListener('click', function () {
+            campo.value = p.nome;
+            lista.innerHTML = '';
+            aoEscolher(p);
+        });
+        return li;
+    }
+
+    function carregar(reiniciar) {
+        if (reiniciar) {
+            pagina = 1;
+            lista.innerHTML = '';
+        }
+
+        fetch(`${url}?q=${encodeURIComponent(termo)}&page=${pagina}`)
+            .then(r => r.json())
+            .then(dados => {
+                const mais = lista.querySelector('.mais');
+                if (mais) mais.remove();
+
+                dados.produtos.forEach(p => lista.appendChild(item(p)));
+
+                if (dados.tem_mais) {
+                    const li = document.createElement('li');
+                    li.className = 'mais';
+                    li.textContent = 'Carregar mais…';
+                    li.addEventListener('click', function () {
+                        pagina += 1;
+                        carregar(false);
+                    });
+                    lista.appendChild(li);
+                }
+            });
+    }
+
+    campo.addEventListener('input', function () {
+        if (aoLimpar) aoLimpar();
+        termo = campo.value.trim();
+        clearTimeout(espera);
+
+        if (!termo) {
+            lista.innerHTML = '';
+            return;
+        }
+        espera = setTimeout(() => carregar(true), 250);
+    });
+}
@@ -0,0 +1,109 @@
+// dashboard.html: busca os números em /dashboard/dados e desenha o gráfico
+document.addEventListener('DOMContentLoaded', function () {
+    const canvas = document.getElementById('graficoVendas');
+    const urlDados = canvas.dataset.urlDados;
+    const urlPagina = canvas.dataset.urlPagina;
+    const formulario = document.getElementById('filtroDatas');
+    const titulos = { dia: 'Vendas por dia', semana: 'Vendas por semana', mes: 'Vendas por mês' };
+    let grafico = null;
+
+    function formatarData(iso) {
+        return iso.split('-').reverse().join('/');
+    }
+
+    function rotuloPeriodo(dados) {
+        if (dados.filtro === 'hoje') return 'Hoje';
+        if (dados.filtro === '7') return 'Últimos 7 dias';
+        if (dados.filtro === '30') return 'Últimos 30 dias';
+        return formatarData(dados.inicio) + ' a ' + formatarData(dados.fim);
+    }
+
+    function desenhar(dados) {
+        document.querySelectorAll('[data-kpi]').forEach(function (campo) {
+            const valor = dados[campo.dataset.kpi];
+            campo.textContent = campo.hasAttribute('data-moeda')
+                ? 'R$ ' + valor.toFixed(2)
+                : valor;
+        });
+        document.getElementById('rotuloPeriodo').textContent = rotuloPeriodo(dados);
+        document.getElementById('valorEstoqueFim').textContent =
+            dados.valor_estoque_fim === null
+                ? ''
+                : 'Em ' + formatarData(dados.fim) + ': R$ ' + dados.valor_estoque_fim.toFixed(2);
+        document.getElementById('tituloGrafico').textContent = titulos[dados.agrupamento];
+        document.querySelectorAll('.filtros-rapidos a').forEach(function (link) {
+            link.classList.toggle('ativo', link.dataset.filtro === dados.filtro);
+        });
+
+        if (grafico) {
+            grafico.data.labels = dados.rotulos;
+            grafico.data.datasets[0].data = dados.valores;
+            grafico.update();
+            return;
+        }
+
+        grafico = new Chart(canvas, {
+            type: 'line',
+            data: {
+                labels: dados.rotulos,
+                datasets: [{
+                    label: 'Vendas (R$)',
+                    data: dados.valores,
+                    borderColor: '#3b82f6',
+                    backgroundColor: 'rgba(59,130,246,0.2)',
+                    borderWidth: 2,
+                    tension: 0.3,
+                    fill: true
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                scales: {
+                    y: { beginAtZero: true }
+                },
+                plugins: {
+                    legend: { display: false }
+                }
+            }
+        });
+    }
+
+    // o navegador manda If-None-Match sozinho; num 304 devolve a cópia guardada
+    function carregar(busca) {
+        return fetch(urlDados + busca, { headers: { 'Accept': 'application/json' } })
+            .then(function (resposta) {
+                if (resposta.ok) return resposta.json().then(desenhar);
+            });
+    }
+
+    // troca de período sem recarregar a página
+    function trocarPeriodo(busca) {
+        history.pushState(null, '', urlPagina + busca);
+        carregar(busca);
+    }
+
+    document.querySelectorAll('.filtros-rapidos a').forEach(function (link) {
+        link.addEventListener('click', function (evento) {
+            evento.preventDefault();
+            formulario.reset();
+            trocarPeriodo('?filtro=' + link.dataset.filtro);
+        });
+    });
+
+    formulario.addEventListener('submit', function (evento) {
+        evento.preventDefault();
+        trocarPeriodo('?' + new URLSearchParams(new FormData(formulario)).toString());
+    });
+
+    window.addEventListener('popstate', function () {
+        carregar(location.search);
+    });
+
+    // atualiza a cada minuto enquanto a aba estiver visível
+    setInterval(function () {
+        if (!document.hidden) carregar(location.search);
+    }, 60000);
+
+    carregar(location.search);
+});
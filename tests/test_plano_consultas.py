@@ -0,0 +1,34 @@
+"""Planos de consulta das telas principais num banco gerado por
+scripts/gerar_dados.py: nenhuma pode varrer venda ou venda_diaria inteira."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import gerar_dados  # noqa: E402
+from comum import carregar_app  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def loja_app(tmp_path_factory):
+    destino = tmp_path_factory.mktemp("banco") / "loja.db"
+    with pytest.MonkeyPatch.context() as ambiente:
+        # carregar_app grava DATABASE_URL no ambiente; o contexto desfaz
+        ambiente.setenv("DATABASE_URL", "")
+        loja, app = carregar_app(f"sqlite:///{destino}")
+        with app.app_context():
+            gerar_dados.gerar(loja, 200, 5000, 2)
+        yield loja, app
+
+
+def test_consultas_usam_indices(loja_app):
+    loja, app = loja_app
+    with app.app_context():
+        total, varreduras = loja.verificar_indices()
+
+    assert total > 0
+    assert varreduras == [], "\n\n".join(
+        f"{detalhe}\n{statement}" for detalhe, statement in varreduras
+    )